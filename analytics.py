@@ -0,0 +1,63 @@
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from engine import FEATURES, RISK_THRESHOLD, STATUS_OK, STATUS_RISK
+from storage import HIST_BINS, STATS_COLUMNS
+
+# --- تحليلات الدفعات: كل الحسابات تتم على جدول الملخصات (يوم × قسم) وليس على السجلات الخام ---
+STATUS_COLORS = {STATUS_OK: '#00b894', STATUS_RISK: '#d63031'}
+FEATURE_LABELS = {
+    'Study_Hours_Per_Week': 'ساعات الدراسة', 'Attendance_Rate': 'نسبة الحضور', 'Previous_Average': 'المعدل السابق',
+    'Failures_History': 'الرسوب', 'Participation_Score': 'التفاعل', 'Marital_Status': 'نسبة المتزوجين', 'English_Score': 'الإنجليزية',
+}
+
+def load_stats(store):
+    columns, rows = store.stats_rows()
+    return pd.DataFrame(rows, columns=columns)
+
+def _summarize(grouped):
+    g = grouped[STATS_COLUMNS].sum()
+    out = pd.DataFrame({'الطلاب': g['n'], 'في دائرة الخطر': g['at_risk'], 'نسبة الخطر': g['at_risk'] / g['n'], 'المعدل المتوقع': g['sum_prediction'] / g['n']})
+    for f in FEATURES: out[FEATURE_LABELS[f]] = g[f'sum_{f}'] / g['n']
+    return out
+
+def department_summary(stats):
+    return _summarize(stats.groupby('Department')).sort_values('نسبة الخطر', ascending=False)
+
+def daily_summary(stats):
+    return _summarize(stats.groupby('day')).sort_index()
+
+def prediction_histogram(stats):
+    width = 100 // HIST_BINS
+    return pd.DataFrame({'range': [f"{i * width}-{(i + 1) * width}" for i in range(HIST_BINS)], 'count': [int(stats[f'bin_{i}'].sum()) for i in range(HIST_BINS)]})
+
+def totals(stats):
+    n = int(stats['n'].sum()); at_risk = int(stats['at_risk'].sum())
+    return {'students': n, 'at_risk': at_risk, 'at_risk_rate': at_risk / n if n else 0.0, 'avg_prediction': stats['sum_prediction'].sum() / n if n else 0.0}
+
+# --- ملخص دفعة مرفوعة (عدد الطلاب وتوزيع الحالة) بدل رسم المخطط من الجدول الكامل ---
+def summarize_batch(df):
+    counts = df['Status'].value_counts()
+    return {'total': len(df), 'at_risk': int(counts.get(STATUS_RISK, 0)), 'status_counts': counts.rename_axis('Status').reset_index(name='count')}
+
+# --- المخططات ---
+def fig_status_pie(status_counts, title='توزيع حالة الدفعة'):
+    return px.pie(status_counts, names='Status', values='count', title=title, color='Status', color_discrete_map=STATUS_COLORS)
+
+def fig_department_risk(dept):
+    fig = px.bar(dept.reset_index(), x='Department', y='نسبة الخطر', text_auto='.0%', title='نسبة الطلاب في دائرة الخطر حسب القسم', color_discrete_sequence=['#d63031'])
+    fig.update_layout(yaxis_tickformat='.0%', xaxis_title=None, height=380, margin=dict(t=50, b=20))
+    return fig
+
+def fig_daily(daily):
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=daily.index, y=daily['الطلاب'], name='عدد التحليلات', marker_color='#dfe6e9', yaxis='y2'))
+    fig.add_trace(go.Scatter(x=daily.index, y=daily['المعدل المتوقع'], name='متوسط المعدل المتوقع', line=dict(color='#0d2c56', width=3)))
+    fig.add_hline(y=RISK_THRESHOLD, line_dash='dot', line_color='#d63031')
+    fig.update_layout(title='التطور اليومي', height=380, margin=dict(t=50, b=20), yaxis=dict(range=[0, 100]), yaxis2=dict(overlaying='y', side='right', showgrid=False), legend=dict(orientation='h'))
+    return fig
+
+def fig_histogram(hist):
+    fig = px.bar(hist, x='range', y='count', title='توزيع المعدلات المتوقعة', color_discrete_sequence=['#0d2c56'])
+    fig.update_layout(xaxis_title=None, yaxis_title=None, height=380, margin=dict(t=50, b=20))
+    return fig
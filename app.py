@@ -1,14 +1,19 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import joblib
-import sqlite3
 import plotly.graph_objects as go
-import plotly.express as px
-from datetime import datetime
 import io
 import streamlit.components.v1 as components
 import os
+from engine import FEATURE_LIMITS
+from analytics import load_stats, summarize_batch, totals, department_summary, daily_summary, prediction_histogram, fig_status_pie, fig_department_risk, fig_daily, fig_histogram
+from ingest import IngestError, file_hash, ingest_upload
+from jobs import get_job_manager, STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE
+from cache import PredictionCache, model_checksum
+from fast_model import MODEL_FILE, load_model as load_fast_model
+from storage import get_store, save_data_collection
+from metrics import METRICS_FILE, get_metrics
+from reports import LOGO_URL, generate_single_report_body, generate_full_html_document, iter_report_bodies, export_batch_reports, render_stats, missing_assets
 
 # --- إعداد الصفحة ---
 st.set_page_config(
@@ -18,24 +23,6 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# --- رابط الشعار المباشر (من موقع الكلية) ---
-LOGO_URL = "https://teeng.alayen.edu.iq/public/ar/image/site/new_logo.png"
-
-# --- دالة الحفظ التلقائي (الاستبيان) ---
-def save_data_collection(student_name, student_id, dept, inputs_df, prediction):
-    file_name = 'collected_dataset.csv'
-    data_to_save = inputs_df.copy()
-    data_to_save.insert(0, 'Prediction', prediction)
-    data_to_save.insert(0, 'Department', dept)
-    data_to_save.insert(0, 'Student_ID', student_id)
-    data_to_save.insert(0, 'Student_Name', student_name)
-    data_to_save['Timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    if not os.path.isfile(file_name):
-        data_to_save.to_csv(file_name, index=False)
-    else:
-        data_to_save.to_csv(file_name, mode='a', header=False, index=False)
-
 # --- CSS ---
 st.markdown("""
 <style>
@@ -88,78 +75,21 @@ def login_screen():
 if st.session_state['user_type'] not in ['admin', 'student']: login_screen(); st.stop()
 
 # ==================== قلب النظام ====================
+# يعاد تحميل النموذج تلقائياً عند تغير بصمة الملف (النسخة الخفيفة iraqi_model_np إن كانت مطابقة، وإلا ملف pkl)
+@st.cache_resource(max_entries=1)
+def load_model(model_sig):
+    return load_fast_model(MODEL_FILE, model_sig)
+
 @st.cache_resource
-def load_model():
-    try: return joblib.load('iraqi_model.pkl')
-    except: return None
-model = load_model()
-
-# --- المحاكاة الذكية ---
-def simulate_improvement(row, model, current_score):
-    scenarios = []
-    def get_val(col): return row[col].values[0] if isinstance(row, pd.DataFrame) else row[col]
-    val_eng = get_val('English_Score'); val_attend = get_val('Attendance_Rate')
-    
-    if val_eng < 60:
-        d = row.copy(); d['English_Score'] += 20; p = model.predict(d)[0]
-        if p > current_score: scenarios.append(f"تعزيز المهارات اللغوية (English Proficiency) قد يرفع المؤشر إلى <b>{p:.1f}%</b>")
-    
-    d_stu = row.copy(); d_stu['Study_Hours_Per_Week'] += 5; p_stu = model.predict(d_stu)[0]
-    if p_stu > current_score: scenarios.append(f"زيادة ساعات الدراسة الذاتية (5 ساعات/أسبوع) سترفع المؤشر إلى <b>{p_stu:.1f}%</b>")
-    
-    if val_attend < 95:
-        d_att = row.copy(); d_att['Attendance_Rate'] = 98; p_att = model.predict(d_att)[0]
-        if p_att > current_score: scenarios.append(f"الانتظام التام في المحاضرات النظرية والعملية سيرفع المؤشر إلى <b>{p_att:.1f}%</b>")
-    return scenarios
-
-# --- توليد التقرير الرسمي ---
-def generate_single_report_body(name, sid, dept, pred, steps, attend, study, eng, married):
-    status = "مستوى حرج 🔴" if pred < 50 else "مستوى مطمئن 🟢"
-    m_status = "متزوج" if married == 1 else "أعزب"
-    rec_html = "".join([f"<li style='margin-bottom:5px;'>{s}</li>" for s in steps])
-    # الشعار في التقرير باستخدام الرابط
-    logo_html = f'<img src="{LOGO_URL}" style="width: 110px; margin-bottom: 5px;">'
-    
-    body = f"""
-    <div class="box page-break">
-        <div class="header">
-            {logo_html}
-            <h2 style="margin:5px 0;">جامعة العين العراقية</h2>
-            <h3 style="margin:0; font-weight:normal;">الكلية التقنية الهندسية - قسم {dept}</h3>
-            <hr style="border-top: 2px solid #000; margin-top:15px;">
-        </div>
-        <div style="background-color: #f9f9f9; padding: 15px; border-radius: 5px; margin-top: 20px;">
-            <table style="width:100%;">
-                <tr><td style="text-align:right;"><strong>الطالب:</strong> {name}</td><td style="text-align:left;"><strong>الرقم الجامعي:</strong> <span class="num">{sid}</span></td></tr>
-                <tr><td style="text-align:right;"><strong>الحالة الاجتماعية:</strong> {m_status}</td><td style="text-align:left;"><strong>كفاءة الإنجليزية:</strong> <span class="num">{eng}%</span></td></tr>
-                <tr><td style="text-align:right;"><strong>تاريخ التقرير:</strong> <span class="num">{datetime.now().strftime('%Y-%m-%d')}</span></td><td style="text-align:left;"><strong>مؤشر الأداء المتوقع:</strong> <span class="num" style="font-size:1.2em;">{pred:.1f}%</span></td></tr>
-            </table>
-        </div>
-        <div style="margin-top:25px;">
-            <h4 style="border-bottom: 1px solid #ccc; padding-bottom: 5px;">أولاً: التشخيص الأكاديمي (Academic Diagnosis)</h4>
-            <p style="line-height: 1.6;">بناءً على خوارزميات الذكاء الاصطناعي، تم تصنيف وضع الطالب ضمن: <strong>{status}</strong>. تشير البيانات إلى أن الالتزام بالحضور بنسبة (<span class="num">{attend}%</span>) والمجهود الدراسي الأسبوعي (<span class="num">{study}</span> ساعة) هما العاملان الأكثر تأثيراً.</p>
-        </div>
-        <div style="margin-top:20px;">
-            <h4 style="border-bottom: 1px solid #ccc; padding-bottom: 5px;">ثانياً: خارطة الطريق المقترحة (Recommended Roadmap)</h4>
-            <ul style="line-height: 1.6;">{rec_html}</ul>
-        </div>
-        <div style="margin-top: 50px; display: flex; justify-content: space-between;">
-            <div style="text-align: center;">____________________<br>توقيع المرشد الأكاديمي</div>
-            <div style="text-align: center;">____________________<br>ختم القسم العلمي</div>
-        </div>
-    </div><br class="no-print">"""
-    return body
-
-def generate_full_html_document(report_bodies, auto_print=False):
-    print_script = "<script>window.onload = function() { window.print(); }</script>" if auto_print else ""
-    html = f"""<!DOCTYPE html><html lang="ar" dir="rtl"><head><meta charset="UTF-8">
-    <style>@import url('https://fonts.googleapis.com/css2?family=Cairo:wght@400;700&display=swap');
-    body {{ font-family: 'Cairo', 'Times New Roman'; padding: 40px; background-color: #f4f4f4; }}
-    .box {{ border: 1px solid #ddd; padding: 40px; max-width: 210mm; margin: auto; background-color: white; margin-bottom: 20px; box-shadow: 0 2px 5px rgba(0,0,0,0.05); }}
-    .header {{ text-align: center; }} table {{ width: 100%; border-collapse: collapse; }} td {{ padding: 10px; border-bottom: 1px solid #eee; }} .num {{ direction: ltr; display: inline-block; font-weight: bold; }}
-    @media print {{ .no-print {{ display: none; }} body {{ background-color: white; padding: 0; }} .box {{ border: none; margin: 0; width: 100%; max-width: 100%; box-shadow: none; }} .page-break {{ page-break-after: always; }} }}
-    </style>{print_script}</head><body><div class="report-container-wrapper">{report_bodies}</div></body></html>"""
-    return html
+def get_prediction_cache():
+    return PredictionCache()
+
+model_sig = model_checksum(MODEL_FILE) if os.path.isfile(MODEL_FILE) else None
+try: model = load_model(model_sig)
+except Exception as e:
+    st.error(f"تعذر تحميل نموذج التنبؤ: {e}"); st.stop()
+pred_cache = get_prediction_cache(); pred_cache.sync_model(model_sig)
+metrics = get_metrics()
 
 # --- وظيفة عرض الداشبورد ---
 def display_student_dashboard(name, sid, dept, pred, steps, attend, study, eng, married, part, att_val):
@@ -172,10 +102,10 @@ def display_student_dashboard(name, sid, dept, pred, steps, attend, study, eng,
         k4.markdown(f"<div class='metric-container'><h5>ساعات الدراسة</h5><h2 style='color:#5f27cd'>{study}</h2></div>", unsafe_allow_html=True)
         
         g1, g2 = st.columns(2)
-        with g1:
+        with metrics.timer('plotly_figures'), g1:
             fig = go.Figure(go.Indicator(mode="gauge+number", value=pred, title={'text':"مؤشر الأداء العام"}, gauge={'axis':{'range':[0,100]}, 'bar':{'color':"#0d2c56"}, 'steps':[{'range':[0,50],'color':'#ff7675'},{'range':[75,100],'color':'#55efc4'}]}))
             st.plotly_chart(fig, use_container_width=True)
-        with g2:
+        with metrics.timer('plotly_figures'), g2:
             st.subheader("📉 تحليل الفجوة (Gap Analysis)")
             categories = ['المعدل المتوقع', 'اللغة الإنجليزية', 'نسبة الحضور']
             student_vals = [pred, eng, attend]; target_vals = [85, 90, 95]
@@ -188,13 +118,98 @@ def display_student_dashboard(name, sid, dept, pred, steps, attend, study, eng,
         for s in steps: st.markdown(f"<li style='direction: rtl; font-size:1.1em;'>{s}</li>", unsafe_allow_html=True)
 
     with t2:
-        body = generate_single_report_body(name, sid, dept, pred, steps, attend, study, eng, married)
-        html_dl = generate_full_html_document(body, auto_print=True)
-        html_prev = generate_full_html_document(body, auto_print=False)
+        with metrics.timer('render_html'):
+            body = generate_single_report_body(name, sid, dept, pred, steps, attend, study, eng, married)
+            html_dl = generate_full_html_document(body, auto_print=True)
+            html_prev = generate_full_html_document(body, auto_print=False)
         components.html(html_prev, height=600, scrolling=True)
         st.download_button("🖨️ طباعة الوثيقة الرسمية", data=html_dl, file_name=f"Official_Report_{sid}.html", mime="text/html", type="primary")
 
 
+# --- ملفات التصدير الكبيرة تولد عند الضغط على زر التحميل فقط ---
+# يمرر لـ download_button كدالة، فلا يحتفظ Streamlit بمحتوى الملف في ذاكرة الجلسة عند كل إعادة تشغيل للسكربت
+def deferred_file(make_path, *args):
+    def read():
+        path = make_path(*args)
+        try:
+            with open(path, 'rb') as f: return f.read()
+        finally: os.remove(path)
+    return read
+
+def export_full_batch(batch_df, group_by, per_file):
+    with metrics.timer('export_batch'): out_path, _ = export_batch_reports(batch_df, model, auto_print=True, group_by=group_by, per_file=per_file)
+    metrics.incr('reports_rendered', len(batch_df))
+    return out_path
+
+# --- لوحة مهام معالجة الدفعات (تتحدث تلقائياً ما دامت هناك مهام قيد المعالجة) ---
+JOBS_PANEL_SIZE = 10
+LARGE_BATCH_ROWS = 2000  # فوق هذا العدد يقترح التصدير المقسم (ZIP) افتراضياً
+
+# نتيجة قراءة الملف تخزن حسب بصمته، فلا يعاد تحليله في كل إعادة تشغيل للسكربت
+# والتوقيت هنا يسجل القراءات الفعلية فقط (إعادة استخدام النتيجة المخزنة لا تمر بهذه الدالة)
+@st.cache_resource(max_entries=4)
+def ingest_upload_cached(digest, file_name, _data):
+    with metrics.timer('parse_upload'): result = ingest_upload(file_name, _data)
+    metrics.incr('rows_parsed', result[2]['rows_total'])
+    return result
+
+@st.cache_resource(max_entries=4)
+def load_job_result(job_id):
+    return get_job_manager().load_result(job_id)
+
+@st.cache_resource(max_entries=4)
+def load_batch_summary(job_id):
+    return summarize_batch(load_job_result(job_id))
+
+# ملخصات السجل التاريخي صغيرة (يوم × قسم) وتقرأ من القاعدة كل 30 ثانية على الأكثر
+@st.cache_data(ttl=30)
+def load_cohort_stats():
+    return load_stats(get_store())
+
+def render_jobs_panel(jobs):
+    recent = jobs.list_jobs(JOBS_PANEL_SIZE)
+    if not recent: return False
+    st.markdown("### ⏳ مهام معالجة الدفعات")
+    for j in recent:
+        c1, c2, c3 = st.columns([3, 5, 1])
+        c1.markdown(f"**{j['file_name']}**  \n{j['created_at']}")
+        if j['status'] in (STATUS_QUEUED, STATUS_RUNNING):
+            c2.progress(j['processed_rows'] / j['total_rows'] if j['total_rows'] else 0.0, text=f"جاري المعالجة: {j['processed_rows']} / {j['total_rows'] or '...'}")
+        elif j['status'] == STATUS_DONE:
+            c2.success(f"✅ {j['total_rows']} طالب - {j['seconds']:.1f} ثانية")
+            if c3.button("فتح", key=f"open_job_{j['id']}"): st.session_state['batch_job_id'] = j['id']; st.rerun()
+        else: c2.error(f"فشلت المعالجة: {j['error']}")
+    return any(j['status'] in (STATUS_QUEUED, STATUS_RUNNING) for j in recent)
+
+@st.fragment(run_every=2)
+def live_jobs_panel(jobs):
+    if not render_jobs_panel(jobs): st.rerun()
+
+# --- لوحة التشخيص (للإدارة فقط): تعرض القياسات حتى آخر تشغيل مكتمل للسكربت ---
+RECENT_TIMINGS_SHOWN = 20
+
+def diagnostics_panel():
+    missing = missing_assets()
+    if missing: st.warning(f"⚠️ ملفات التقارير غير موجودة ({', '.join(missing)})، فالتقارير المطبوعة تحتاج إلى الإنترنت لتحميل الشعار والخطوط. لتجهيزها مرة واحدة: `python reports.py --fetch-assets`")
+    with st.expander("🩺 التشخيص والأداء"):
+        r_stats = render_stats(); c_stats = pred_cache.stats()
+        if r_stats['reports']: st.caption(f"⏱️ توليد التقارير: {r_stats['reports']} تقرير - متوسط {r_stats['avg_ms']:.3f} ms/تقرير")
+        st.caption(f"🧠 ذاكرة التنبؤ: {c_stats['entries']} عنصر - إصابات {c_stats['hits']} / إخفاقات {c_stats['misses']} ({c_stats['hit_rate']:.0%})")
+        counters = metrics.counters()
+        if counters: st.dataframe(pd.DataFrame(counters.items(), columns=['العداد', 'القيمة']), hide_index=True, use_container_width=True)
+        summary = metrics.stage_summary()
+        if summary:
+            st.markdown("**زمن المراحل (ms)**")
+            st.dataframe(pd.DataFrame(summary).drop(columns='total_s'), hide_index=True, use_container_width=True, column_config={c: st.column_config.NumberColumn(format="%.2f") for c in ['avg_ms', 'p50_ms', 'p95_ms', 'max_ms']})
+            st.markdown("**آخر القياسات**")
+            st.dataframe(pd.DataFrame(metrics.recent(RECENT_TIMINGS_SHOWN)), hide_index=True, use_container_width=True, column_config={'ms': st.column_config.NumberColumn(format="%.2f")})
+        else: st.caption("لا توجد قياسات بعد.")
+        d1, d2 = st.columns(2)
+        if d1.button("💾 حفظ في ملف", use_container_width=True):
+            path = metrics.export(METRICS_FILE, prediction_cache=c_stats, reports=r_stats)
+            st.success(f"تم الحفظ في {path}")
+        if d2.button("↺ تصفير", use_container_width=True): metrics.reset(); st.rerun()
+
 # --- الواجهة الرئيسية ---
 col_h1, col_h2 = st.columns([1, 4])
 with col_h1:
@@ -210,16 +225,20 @@ with st.sidebar:
     st.header("⚙️ الإعدادات")
     if st.session_state['user_type'] == 'admin':
         st.markdown("### 📥 بيانات الاستبيان")
-        if os.path.isfile('collected_dataset.csv'):
-            with open('collected_dataset.csv', 'rb') as f:
-                st.download_button("تحميل قاعدة البيانات المجمعة", f, file_name="Students_Dataset.csv", mime='text/csv')
+        store = get_store(); n_saved = store.count()
+        if n_saved:
+            st.caption(f"عدد السجلات المحفوظة: {n_saved}")
+            exp_fmt = st.radio("صيغة التصدير", ["CSV", "Excel"], horizontal=True)
+            if exp_fmt == "CSV": st.download_button("تحميل قاعدة البيانات المجمعة", deferred_file(store.export_csv), file_name="Students_Dataset.csv", mime='text/csv', use_container_width=True)
+            else: st.download_button("تحميل قاعدة البيانات المجمعة", deferred_file(store.export_excel), file_name="Students_Dataset.xlsx", mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', use_container_width=True)
         else:
             st.caption("لا توجد بيانات محفوظة بعد.")
+        diagnostics_panel()
             
     if st.button("🚪 تسجيل الخروج", use_container_width=True): st.session_state['user_type']=None; st.rerun()
 
 if st.session_state['user_type'] == 'admin':
-    selected_mode = st.radio("اختر نمط العمل:", ["📥 إدخال بيانات فردي", "📂 استيراد ملف دفعة كاملة (Excel)"], horizontal=True)
+    selected_mode = st.radio("اختر نمط العمل:", ["📥 إدخال بيانات فردي", "📂 استيراد ملف دفعة كاملة (Excel)", "📊 تحليلات الدفعات (السجل التاريخي)"], horizontal=True)
 else:
     selected_mode = "📥 إدخال بيانات فردي"
 
@@ -230,82 +249,105 @@ if "إدخال بيانات فردي" in selected_mode:
         with c1:
             s_name = st.text_input("الاسم الرباعي"); s_id = st.text_input("الرقم الجامعي"); s_dept = st.selectbox("القسم العلمي", ["هندسة الحاسوب", "هندسة تقنيات الحاسوب", "هندسة الأجهزة الطبية", "AI"])
         with c2:
-            val_prev = st.slider("المعدل السابق (%)", 50, 100, 70); s_eng = st.slider("مستوى اللغة الإنجليزية (%)", 0, 100, 50); val_stu = st.number_input("ساعات الدراسة", 1, 50, 10)
+            val_prev = st.slider("المعدل السابق (%)", *FEATURE_LIMITS['Previous_Average'], 70); s_eng = st.slider("مستوى اللغة الإنجليزية (%)", *FEATURE_LIMITS['English_Score'], 50); val_stu = st.number_input("ساعات الدراسة", *FEATURE_LIMITS['Study_Hours_Per_Week'], 10)
         with c3:
-            val_att = st.slider("نسبة الحضور (%)", 0, 100, 80); val_part = st.slider("التفاعل (1-10)", 1, 10, 5); val_fail = st.selectbox("الرسوب", [0, 1, 2, 3])
+            val_att = st.slider("نسبة الحضور (%)", *FEATURE_LIMITS['Attendance_Rate'], 80); val_part = st.slider("التفاعل (1-10)", *FEATURE_LIMITS['Participation_Score'], 5); val_fail = st.selectbox("الرسوب", list(range(FEATURE_LIMITS['Failures_History'][0], FEATURE_LIMITS['Failures_History'][1] + 1)))
             s_married_opt = st.radio("الحالة الاجتماعية", ["أعزب", "متزوج"], horizontal=True); val_married = 1 if s_married_opt == "متزوج" else 0
         analyze_btn = st.button("🚀 إجراء التحليل الذكي", type="primary", use_container_width=True)
 
     if analyze_btn and s_name:
         row = pd.DataFrame({'Study_Hours_Per_Week': [val_stu], 'Attendance_Rate': [val_att], 'Previous_Average': [val_prev], 'Failures_History': [val_fail], 'Participation_Score': [val_part], 'Marital_Status': [val_married], 'English_Score': [s_eng]})
-        pred = model.predict(row)[0]
-        steps = simulate_improvement(row, model, pred)
-        save_data_collection(s_name, s_id, s_dept, row, pred)
+        with metrics.timer('predict'): pred = pred_cache.predict(model, row)[0]
+        with metrics.timer('simulate'): steps = pred_cache.simulate(model, row, pred)
+        with metrics.timer('save'): save_data_collection(s_name, s_id, s_dept, row, pred)
+        metrics.incr('predictions')
         st.markdown("---")
         st.subheader(f"📊 نتائج التحليل للطالب: {s_name}")
         display_student_dashboard(s_name, s_id, s_dept, pred, steps, val_att, val_stu, s_eng, val_married, val_part, val_att)
 
 # --- نمط استيراد الملف ---
 elif "استيراد ملف" in selected_mode:
+    jobs = get_job_manager()
     st.info("يرجى رفع ملف Excel يحتوي على بيانات الطلاب.")
     up_file = st.file_uploader("اختر الملف", type=['xlsx', 'csv'])
     
     if up_file:
-        if up_file.name.endswith('.csv'): df_upload = pd.read_csv(up_file)
-        else: df_upload = pd.read_excel(up_file)
+        up_data = up_file.getvalue()
+        try:
+            valid_df, errors_df, in_stats = ingest_upload_cached(file_hash(up_data), up_file.name, up_data)
+            st.caption(f"تمت قراءة {in_stats['rows_total']} صف خلال {in_stats['seconds']:.2f} ثانية: {in_stats['rows_valid']} صالح، {in_stats['rows_rejected']} مرفوض")
+            if len(errors_df):
+                st.warning(f"تم استبعاد {in_stats['rows_rejected']} صفاً لاحتوائها على قيم غير صالحة، راجع تقرير الأخطاء.")
+                st.download_button("📄 تحميل تقرير الأخطاء", errors_df.to_csv(index=False).encode('utf-8-sig'), "Upload_Errors.csv", "text/csv")
+            if st.button("⚡ بدء معالجة الدفعة", disabled=valid_df.empty):
+                st.session_state['batch_job_id'] = jobs.submit(up_file.name, valid_df)
+                st.success("تمت إضافة الملف إلى طابور المعالجة، يمكنك متابعة التقدم أدناه.")
+        except IngestError as e: st.error(str(e))
+
+    if any(j['status'] in (STATUS_QUEUED, STATUS_RUNNING) for j in jobs.list_jobs(JOBS_PANEL_SIZE)): live_jobs_panel(jobs)
+    else: render_jobs_panel(jobs)
+
+    job = jobs.get(st.session_state['batch_job_id']) if 'batch_job_id' in st.session_state else None
+    if job and job['status'] == STATUS_DONE:
+        batch_df = load_job_result(job['id'])
+        st.success(f"نتائج الملف: {job['file_name']} ({job['total_rows']} طالب خلال {job['seconds']:.2f} ثانية)")
+        st.divider()
+        c1, c2 = st.columns([1, 2])
+        with c1:
+            summary = load_batch_summary(job['id'])
+            st.metric("إجمالي الطلاب", summary['total']); st.metric("في دائرة الخطر", summary['at_risk'], delta_color="inverse")
+        with metrics.timer('plotly_figures'), c2:
+            st.plotly_chart(fig_status_pie(summary['status_counts']), use_container_width=True)
         
-        if st.button("⚡ بدء معالجة الدفعة"):
-            if 'Marital_Status' not in df_upload.columns: df_upload['Marital_Status'] = 0
-            if 'English_Score' not in df_upload.columns: df_upload['English_Score'] = 50
-            preds = []
-            for i, r in df_upload.iterrows():
-                row = pd.DataFrame({'Study_Hours_Per_Week': [r['Study_Hours_Per_Week']], 'Attendance_Rate': [r['Attendance_Rate']], 'Previous_Average': [r['Previous_Average']], 'Failures_History': [r['Failures_History']], 'Participation_Score': [r['Participation_Score']], 'Marital_Status': [r['Marital_Status']], 'English_Score': [r['English_Score']]})
-                preds.append(model.predict(row)[0])
-            df_upload['Prediction'] = preds
-            df_upload['Status'] = df_upload['Prediction'].apply(lambda x: 'مستوى مطمئن' if x >= 50 else 'مستوى حرج')
-            st.session_state['batch_df'] = df_upload
-            st.success("تمت المعالجة بنجاح!")
-
-        if 'batch_df' in st.session_state:
-            st.divider()
-            c1, c2 = st.columns([1, 2])
-            with c1:
-                total = len(st.session_state['batch_df']); critical = len(st.session_state['batch_df'][st.session_state['batch_df']['Status']=='مستوى حرج'])
-                st.metric("إجمالي الطلاب", total); st.metric("في دائرة الخطر", critical, delta_color="inverse")
-            with c2:
-                fig_pie = px.pie(st.session_state['batch_df'], names='Status', title='توزيع حالة الدفعة', color='Status', color_discrete_map={'مستوى مطمئن':'#00b894', 'مستوى حرج':'#d63031'})
-                st.plotly_chart(fig_pie, use_container_width=True)
-            
-            st.markdown("### 📋 سجل الطلاب (حدد طالباً واحداً للمعاينة، أو مجموعة للطباعة)")
-            event = st.dataframe(st.session_state['batch_df'][['Student_Name', 'Department', 'Prediction', 'Status']], on_select="rerun", selection_mode="multi-row", use_container_width=True)
-            sel_idx = event.selection.rows
-            
-            if len(sel_idx) == 0:
-                st.info("👆 قم باختيار طالب من الجدول لعرض تفاصيله.")
-            elif len(sel_idx) == 1:
-                idx = sel_idx[0]; r = st.session_state['batch_df'].iloc[idx]
-                sim_row = pd.DataFrame({'Study_Hours_Per_Week': [r['Study_Hours_Per_Week']], 'Attendance_Rate': [r['Attendance_Rate']], 'Previous_Average': [r['Previous_Average']], 'Failures_History': [r['Failures_History']], 'Participation_Score': [r['Participation_Score']], 'Marital_Status': [r['Marital_Status']], 'English_Score': [r['English_Score']]})
-                steps = simulate_improvement(sim_row, model, r['Prediction'])
-                st.markdown("---")
-                st.subheader(f"🔍 التفاصيل الفردية للطالب: {r['Student_Name']}")
-                display_student_dashboard(r['Student_Name'], str(r['Student_ID']), r['Department'], r['Prediction'], steps, r['Attendance_Rate'], r['Study_Hours_Per_Week'], r['English_Score'], r['Marital_Status'], r['Participation_Score'], r['Attendance_Rate'])
-            else:
-                st.success(f"✅ تم تحديد {len(sel_idx)} طالباً للطباعة الجماعية.")
-                bodies = ""
-                for idx in sel_idx:
-                    r = st.session_state['batch_df'].iloc[idx]
-                    sim_row = pd.DataFrame({'Study_Hours_Per_Week': [r['Study_Hours_Per_Week']], 'Attendance_Rate': [r['Attendance_Rate']], 'Previous_Average': [r['Previous_Average']], 'Failures_History': [r['Failures_History']], 'Participation_Score': [r['Participation_Score']], 'Marital_Status': [r['Marital_Status']], 'English_Score': [r['English_Score']]})
-                    steps = simulate_improvement(sim_row, model, r['Prediction'])
-                    bodies += generate_single_report_body(r['Student_Name'], str(r['Student_ID']), r['Department'], r['Prediction'], steps, r['Attendance_Rate'], r['Study_Hours_Per_Week'], r['English_Score'], r['Marital_Status'])
+        st.markdown("### 📋 سجل الطلاب (حدد طالباً واحداً للمعاينة، أو مجموعة للطباعة)")
+        event = st.dataframe(batch_df[['Student_Name', 'Department', 'Prediction', 'Status']], on_select="rerun", selection_mode="multi-row", use_container_width=True)
+        sel_idx = event.selection.rows
+        
+        if len(sel_idx) == 0:
+            st.info("👆 قم باختيار طالب من الجدول لعرض تفاصيله.")
+        elif len(sel_idx) == 1:
+            idx = sel_idx[0]; r = batch_df.iloc[idx]
+            with metrics.timer('simulate'): steps = pred_cache.simulate(model, r, r['Prediction'])
+            st.markdown("---")
+            st.subheader(f"🔍 التفاصيل الفردية للطالب: {r['Student_Name']}")
+            display_student_dashboard(r['Student_Name'], str(r['Student_ID']), r['Department'], r['Prediction'], steps, r['Attendance_Rate'], r['Study_Hours_Per_Week'], r['English_Score'], r['Marital_Status'], r['Participation_Score'], r['Attendance_Rate'])
+        else:
+            st.success(f"✅ تم تحديد {len(sel_idx)} طالباً للطباعة الجماعية.")
+            with metrics.timer('render_html'):
+                bodies = "".join(iter_report_bodies(batch_df.iloc[sel_idx], model))
                 final_html = generate_full_html_document(bodies, auto_print=True)
-                st.download_button("🖨️ تحميل التقارير المجمعة (ملف واحد)", final_html, "Batch_Reports.html", "text/html", type="primary")
-
-            with st.expander("خيارات متقدمة"):
-                 if st.button("🖨️ طباعة تقارير الدفعة بالكامل"):
-                    bodies = ""
-                    for i, r in st.session_state['batch_df'].iterrows():
-                        sim_row = pd.DataFrame({'Study_Hours_Per_Week': [r['Study_Hours_Per_Week']], 'Attendance_Rate': [r['Attendance_Rate']], 'Previous_Average': [r['Previous_Average']], 'Failures_History': [r['Failures_History']], 'Participation_Score': [r['Participation_Score']], 'Marital_Status': [r['Marital_Status']], 'English_Score': [r['English_Score']]})
-                        steps = simulate_improvement(sim_row, model, r['Prediction'])
-                        bodies += generate_single_report_body(r['Student_Name'], str(r['Student_ID']), r['Department'], r['Prediction'], steps, r['Attendance_Rate'], r['Study_Hours_Per_Week'], r['English_Score'], r['Marital_Status'])
-                    final_html = generate_full_html_document(bodies, auto_print=True)
-                    st.download_button("📥 تحميل الملف الشامل للدفعة", final_html, "Full_Batch.html", "text/html")
+            metrics.incr('reports_rendered', len(sel_idx))
+            st.download_button("🖨️ تحميل التقارير المجمعة (ملف واحد)", final_html, "Batch_Reports.html", "text/html", type="primary")
+
+        with st.expander("خيارات متقدمة"):
+             split_opts = ["ملف واحد", "ملف لكل قسم (ZIP)", "ملفات مقسمة حسب عدد الطلاب (ZIP)"]
+             split_opt = st.radio("طريقة التصدير", split_opts, index=2 if len(batch_df) > LARGE_BATCH_ROWS else 0, horizontal=True)
+             per_file = st.number_input("عدد الطلاب في كل ملف", 50, 5000, 500, step=50) if "عدد الطلاب" in split_opt else None
+             group_by = 'Department' if "لكل قسم" in split_opt else None
+             export_data = deferred_file(export_full_batch, batch_df, group_by, per_file)
+             if group_by or per_file: st.download_button("🖨️ تحميل تقارير الدفعة بالكامل (ZIP)", export_data, "Full_Batch_Reports.zip", "application/zip")
+             else: st.download_button("🖨️ تحميل تقارير الدفعة بالكامل", export_data, "Full_Batch.html", "text/html")
+
+# --- تحليلات الدفعات (من الملخصات التراكمية) ---
+elif "تحليلات" in selected_mode:
+    stats = load_cohort_stats()
+    if stats.empty:
+        st.info("لا توجد بيانات تاريخية بعد. تظهر التحليلات بعد حفظ نتائج التحليل الفردي.")
+    else:
+        depts = sorted(stats['Department'].unique())
+        sel_depts = st.multiselect("الأقسام", depts, default=depts)
+        stats = stats[stats['Department'].isin(sel_depts)]
+        if stats.empty: st.warning("اختر قسماً واحداً على الأقل.")
+        else:
+            tot = totals(stats)
+            k1, k2, k3, k4 = st.columns(4)
+            k1.metric("إجمالي التحليلات", f"{tot['students']:,}"); k2.metric("في دائرة الخطر", f"{tot['at_risk']:,}")
+            k3.metric("نسبة الخطر", f"{tot['at_risk_rate']:.1%}"); k4.metric("متوسط المعدل المتوقع", f"{tot['avg_prediction']:.1f}%")
+            dept = department_summary(stats)
+            g1, g2 = st.columns(2)
+            with metrics.timer('plotly_figures'):
+                with g1: st.plotly_chart(fig_department_risk(dept), use_container_width=True)
+                with g2: st.plotly_chart(fig_histogram(prediction_histogram(stats)), use_container_width=True)
+                st.plotly_chart(fig_daily(daily_summary(stats)), use_container_width=True)
+            st.markdown("### 📋 متوسطات الخصائص حسب القسم")
+            st.dataframe(dept.style.format({'نسبة الخطر': '{:.1%}'}, precision=1), use_container_width=True)
@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from engine import FEATURES, FEATURE_LIMITS, predict_batch, simulate_cohort, simulate_improvement
+from fast_model import MODEL_FILE
+from ingest import ingest_upload
+from reports import export_batch_reports, generate_full_html_document, generate_single_report_body
+from storage import SurveyStore, save_data_collection
+
+# --- قياس أداء المسارات الحرجة دون تشغيل خادم Streamlit ---
+# مثال: python benchmark.py --sizes 100 1000 10000 --compare bench_results/previous.json
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+DEPARTMENTS = ["هندسة الحاسوب", "هندسة تقنيات الحاسوب", "هندسة الأجهزة الطبية", "AI"]
+RESULTS_DIR = 'bench_results'
+
+def synthetic_cohort(n, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'Student_Name': [f"طالب {i}" for i in range(n)], 'Student_ID': [f"{20240000 + i}" for i in range(n)], 'Department': rng.choice(DEPARTMENTS, n)})
+    for col in FEATURES:
+        lo, hi = FEATURE_LIMITS[col]
+        df[col] = rng.integers(lo, hi + 1, n)
+    return df
+
+def load_model(backend):
+    if backend == 'sklearn':
+        import joblib
+        return joblib.load(MODEL_FILE)
+    from cache import model_checksum
+    from fast_model import load_model as load_fast_model
+    return load_fast_model(MODEL_FILE, model_checksum(MODEL_FILE))
+
+def _percentiles(samples):
+    ms = np.asarray(samples) * 1000
+    return {'samples': len(ms), 'p50_ms': float(np.percentile(ms, 50)), 'p90_ms': float(np.percentile(ms, 90)), 'p99_ms': float(np.percentile(ms, 99)), 'max_ms': float(ms.max()), 'rows_per_sec': float(1000 / ms.mean())}
+
+# زمن كامل للمرحلة، ثم (اختيارياً) تشغيل ثان تحت tracemalloc لقياس ذروة الذاكرة دون التأثير على التوقيت
+def _stage(fn, rows, measure_memory):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    out = {'rows': rows, 'seconds': elapsed, 'rows_per_sec': rows / elapsed if elapsed > 0 else None}
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            fn()
+            out['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+        finally: tracemalloc.stop()
+    return out
+
+def _per_call(fn, items):
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return _percentiles(samples)
+
+def run_size(n, model, args):
+    df = synthetic_cohort(n, args.seed)
+    csv_bytes = df.to_csv(index=False).encode('utf-8')
+    scored, _ = predict_batch(df, model)
+    sample = scored.head(min(n, args.per_row_limit))
+    rows = [r.to_frame().T for _, r in sample[FEATURES].iterrows()]
+    steps = simulate_cohort(sample, model, sample['Prediction'])
+    report_args = [(r['Student_Name'], r['Student_ID'], r['Department'], r['Prediction'], s, r['Attendance_Rate'], r['Study_Hours_Per_Week'], r['English_Score'], r['Marital_Status']) for (_, r), s in zip(sample.iterrows(), steps)]
+    bodies = "".join(generate_single_report_body(*a) for a in report_args)
+    mem = not args.no_memory
+    stages = {}
+
+    stages['ingest'] = _stage(lambda: ingest_upload('cohort.csv', csv_bytes), n, mem)
+    stages['predict_batched'] = _stage(lambda: predict_batch(df, model), n, mem)
+    stages['predict_per_row'] = _per_call(model.predict, rows)
+    stages['simulate_per_row'] = _per_call(lambda i: simulate_improvement(rows[i], model, sample['Prediction'].iat[i]), range(len(rows)))
+    stages['simulate_cohort'] = _stage(lambda: simulate_cohort(scored, model, scored['Prediction']), n, mem)
+    stages['report_body'] = _per_call(lambda a: generate_single_report_body(*a), report_args)
+    stages['full_html_document'] = _stage(lambda: generate_full_html_document(bodies, auto_print=True), len(report_args), mem)
+
+    def export():
+        path, _ = export_batch_reports(scored, model)
+        os.remove(path)
+    stages['export_stream'] = _stage(export, n, mem)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SurveyStore(os.path.join(tmp, 'bench.db'), legacy_csv=None)
+        stages['save_data_collection'] = _per_call(lambda i: save_data_collection(sample['Student_Name'].iat[i], sample['Student_ID'].iat[i], sample['Department'].iat[i], rows[i], sample['Prediction'].iat[i], store=store), range(len(rows)))
+        start = time.perf_counter(); store.flush()
+        stages['save_data_collection']['flush_seconds'] = time.perf_counter() - start
+        store.close()
+    return {'n': n, 'stages': stages}
+
+def _git_commit():
+    try: return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception: return None
+
+def _max_rss_mb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError: return None
+
+def _headline(stage):
+    return stage['p50_ms'] if 'p50_ms' in stage else stage['seconds'] * 1000
+
+def print_result(result):
+    print(f"\n== {result['n']:,} students ==")
+    for name, s in result['stages'].items():
+        if 'p50_ms' in s: print(f"  {name:<22} p50 {s['p50_ms']:9.3f} ms  p90 {s['p90_ms']:9.3f} ms  p99 {s['p99_ms']:9.3f} ms  ({s['samples']} calls, {s['rows_per_sec']:,.0f} rows/s)")
+        else: print(f"  {name:<22} {s['seconds'] * 1000:11.1f} ms total  {s['rows_per_sec'] or 0:>12,.0f} rows/s" + (f"  peak {s['peak_mb']:.1f} MB" if 'peak_mb' in s else ''))
+
+# --- المقارنة مع نتائج سابقة: نسبة الزمن الحالي إلى السابق لكل مرحلة ---
+def compare(report, baseline_path, threshold):
+    with open(baseline_path, encoding='utf-8') as f: baseline = json.load(f)
+    base = {r['n']: r['stages'] for r in baseline['results']}
+    regressions = []
+    print(f"\n== comparison with {baseline_path} ({baseline['meta'].get('git_commit')}) ==")
+    for result in report['results']:
+        for name, s in result['stages'].items():
+            old = base.get(result['n'], {}).get(name)
+            if not old: continue
+            ratio = _headline(s) / _headline(old) if _headline(old) else float('inf')
+            flag = '  REGRESSION' if ratio > threshold else ''
+            print(f"  n={result['n']:<7} {name:<22} x{ratio:5.2f}{flag}")
+            if flag: regressions.append((result['n'], name, ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmark for the prediction, simulation, reporting and storage hot paths")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--backend', choices=['fast', 'sklearn'], default='fast')
+    parser.add_argument('--per-row-limit', type=int, default=500, help="rows sampled for per-call latency stages")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--output', help=f"JSON output path (default: {RESULTS_DIR}/<timestamp>.json)")
+    parser.add_argument('--compare', help="previous JSON result to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25, help="ratio above which a stage counts as a regression")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    model = load_model(args.backend)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'), 'git_commit': _git_commit(), 'backend': args.backend, 'model': type(model).__name__,
+            'model_load_seconds': time.perf_counter() - start, 'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'per_row_limit': args.per_row_limit,
+        },
+        'results': [],
+    }
+    for n in args.sizes:
+        result = run_size(n, model, args)
+        report['results'].append(result)
+        print_result(result)
+    report['meta']['max_rss_mb'] = _max_rss_mb()
+
+    path = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f: json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nresults written to {path}")
+    if args.compare and compare(report, args.compare, args.threshold): return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from engine import FEATURES, prepare_features, simulate_cohort
+
+CACHE_MAX_ENTRIES = 20000
+CACHE_TTL_SECONDS = 6 * 3600
+
+# --- بصمة ملف النموذج: يعاد حساب الـ checksum فقط عند تغير وقت التعديل أو الحجم ---
+_sig_lock = threading.Lock()
+_sig_memo = {}
+
+def model_checksum(path):
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _sig_lock:
+        memo = _sig_memo.get(path)
+        if memo and memo[0] == stamp: return memo[1]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''): h.update(block)
+    with _sig_lock: _sig_memo[path] = (stamp, h.hexdigest())
+    return h.hexdigest()
+
+# --- ذاكرة مؤقتة (LRU + TTL) أمام model.predict و simulate_improvement ---
+# المفتاح: بصمة النموذج + قيم الخصائص السبع، وتفرغ تلقائياً عند تغير ملف النموذج
+class PredictionCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.model_sig = None
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sync_model(self, model_sig):
+        with self._lock:
+            if model_sig != self.model_sig:
+                self._data.clear(); self.model_sig = model_sig
+
+    def _get(self, key, now):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < now:
+            if entry is not None: del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _put(self, key, value, now):
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries: self._data.popitem(last=False)
+
+    def _keys(self, df, kind):
+        X = prepare_features(df)[FEATURES].astype(float)
+        return X, [(kind, self.model_sig, row) for row in X.itertuples(index=False, name=None)]
+
+    # تنبؤ بالصفوف غير الموجودة فقط، في استدعاء predict واحد
+    def predict(self, model, df):
+        X, keys = self._keys(df, 'predict')
+        now = time.monotonic()
+        with self._lock: values = [self._get(k, now) for k in keys]
+        missing = [i for i, v in enumerate(values) if v is None]
+        if missing:
+            preds = model.predict(X.iloc[missing])
+            with self._lock:
+                for i, p in zip(missing, preds):
+                    values[i] = float(p); self._put(keys[i], values[i], now)
+        return values
+
+    def simulate(self, model, row, current_score):
+        if isinstance(row, pd.Series): row = row.to_frame().T
+        _, keys = self._keys(row, 'simulate')
+        key = keys[0] + (float(current_score),)
+        now = time.monotonic()
+        with self._lock: steps = self._get(key, now)
+        if steps is None:
+            steps = simulate_cohort(row, model, [current_score])[0]
+            with self._lock: self._put(key, steps, now)
+        return list(steps)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'entries': len(self._data), 'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
@@ -0,0 +1,98 @@
+import time
+import numpy as np
+import pandas as pd
+
+# --- أعمدة النموذج (بنفس الترتيب الذي تدرب عليه) ---
+FEATURES = ['Study_Hours_Per_Week', 'Attendance_Rate', 'Previous_Average', 'Failures_History', 'Participation_Score', 'Marital_Status', 'English_Score']
+FEATURE_DEFAULTS = {'Marital_Status': 0, 'English_Score': 50}
+# الحدود المسموحة لكل خاصية (نفس حدود نموذج الإدخال الفردي)
+FEATURE_LIMITS = {
+    'Study_Hours_Per_Week': (1, 50), 'Attendance_Rate': (0, 100), 'Previous_Average': (50, 100), 'Failures_History': (0, 3),
+    'Participation_Score': (1, 10), 'Marital_Status': (0, 1), 'English_Score': (0, 100),
+}
+STATUS_OK = 'مستوى مطمئن'
+STATUS_RISK = 'مستوى حرج'
+RISK_THRESHOLD = 50
+BATCH_CHUNK_SIZE = 50000
+
+# --- تجهيز مصفوفة الخصائص للدفعة كاملة (مرة واحدة بدل كل صف) ---
+def prepare_features(df):
+    df = df.copy()
+    for col, default in FEATURE_DEFAULTS.items():
+        if col not in df.columns: df[col] = default
+        else: df[col] = df[col].fillna(default)
+    missing = [c for c in FEATURES if c not in df.columns]
+    if missing: raise ValueError(f"الأعمدة التالية مفقودة من الملف: {', '.join(missing)}")
+    return df
+
+def status_labels(preds):
+    return np.where(np.asarray(preds) >= RISK_THRESHOLD, STATUS_OK, STATUS_RISK)
+
+# --- محرك التنبؤ الجماعي ---
+def predict_batch(df, model, chunk_size=BATCH_CHUNK_SIZE):
+    start = time.perf_counter()
+    df = prepare_features(df)
+    X = df[FEATURES].astype(float)
+    preds = np.empty(len(X), dtype=float)
+    for s in range(0, len(X), chunk_size):
+        preds[s:s + chunk_size] = model.predict(X.iloc[s:s + chunk_size])
+    df['Prediction'] = preds
+    df['Status'] = status_labels(preds)
+    elapsed = time.perf_counter() - start
+    stats = {'rows': len(df), 'seconds': elapsed, 'rows_per_sec': len(df) / elapsed if elapsed > 0 else float('inf')}
+    return df, stats
+
+# --- سيناريوهات المحاكاة (التدخلات المقترحة) ---
+# mode: 'add' يضيف القيمة للعمود، 'set' يستبدلها. when: شرط تطبيق التدخل على الطالب (None = للجميع)
+DEFAULT_INTERVENTIONS = [
+    {'column': 'English_Score', 'mode': 'add', 'value': 20, 'when': lambda X: X['English_Score'] < 60,
+     'text': "تعزيز المهارات اللغوية (English Proficiency) قد يرفع المؤشر إلى <b>{p:.1f}%</b>"},
+    {'column': 'Study_Hours_Per_Week', 'mode': 'add', 'value': 5, 'when': None,
+     'text': "زيادة ساعات الدراسة الذاتية (5 ساعات/أسبوع) سترفع المؤشر إلى <b>{p:.1f}%</b>"},
+    {'column': 'Attendance_Rate', 'mode': 'set', 'value': 98, 'when': lambda X: X['Attendance_Rate'] < 95,
+     'text': "الانتظام التام في المحاضرات النظرية والعملية سيرفع المؤشر إلى <b>{p:.1f}%</b>"},
+]
+
+# تدخلات إضافية اختيارية يمكن تمريرها مع الافتراضية: DEFAULT_INTERVENTIONS + EXTRA_INTERVENTIONS
+EXTRA_INTERVENTIONS = [
+    {'column': 'Participation_Score', 'mode': 'add', 'value': 2, 'max': 10, 'when': lambda X: X['Participation_Score'] < 10,
+     'text': "رفع مستوى التفاعل والمشاركة الصفية سيرفع المؤشر إلى <b>{p:.1f}%</b>"},
+    {'column': 'Failures_History', 'mode': 'add', 'value': -1, 'min': 0, 'when': lambda X: X['Failures_History'] > 0,
+     'text': "تجاوز مادة راسب واحدة على الأقل (إكمال المواد المتبقية) سيرفع المؤشر إلى <b>{p:.1f}%</b>"},
+]
+
+def _apply_intervention(X, iv):
+    d = X.copy()
+    col = iv['column']
+    d[col] = d[col] + iv['value'] if iv['mode'] == 'add' else float(iv['value'])
+    if 'min' in iv or 'max' in iv: d[col] = d[col].clip(lower=iv.get('min'), upper=iv.get('max'))
+    return d
+
+# --- محاكاة الدفعة كاملة: كل السيناريوهات لكل الطلاب في مصفوفة واحدة واستدعاء predict واحد ---
+def simulate_cohort(df, model, current_scores, interventions=DEFAULT_INTERVENTIONS):
+    X = prepare_features(df)[FEATURES].astype(float).reset_index(drop=True)
+    current_scores = np.asarray(current_scores, dtype=float)
+    n = len(X)
+    if n == 0: return []
+    masks, variants = [], []
+    for iv in interventions:
+        mask = np.ones(n, dtype=bool) if iv['when'] is None else np.asarray(iv['when'](X), dtype=bool)
+        masks.append(mask)
+        if mask.any(): variants.append(_apply_intervention(X[mask], iv))
+    preds = model.predict(pd.concat(variants, ignore_index=True)) if variants else np.empty(0)
+
+    # توزيع النتائج على الطلاب بنفس ترتيب التدخلات
+    results = [[] for _ in range(n)]
+    offset = 0
+    for iv, mask in zip(interventions, masks):
+        idx = np.flatnonzero(mask)
+        p_iv = preds[offset:offset + len(idx)]
+        offset += len(idx)
+        better = p_iv > current_scores[idx]
+        for i, p in zip(idx[better], p_iv[better]):
+            results[i].append(iv['text'].format(p=p))
+    return results
+
+def simulate_improvement(row, model, current_score, interventions=DEFAULT_INTERVENTIONS):
+    if isinstance(row, pd.Series): row = row.to_frame().T
+    return simulate_cohort(row, model, [current_score], interventions)[0]
@@ -0,0 +1,116 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# --- نسخة خفيفة من النموذج للاستدلال: مصفوفات NumPy تقرأ بنمط memory-map ---
+# تتشارك عمليات الخادم المتعددة نفس صفحات الذاكرة ولا تحتاج لاستيراد scikit-learn عند الإقلاع
+MODEL_FILE = 'iraqi_model.pkl'
+FAST_MODEL_DIR = 'iraqi_model_np'
+META_FILE = 'meta.json'
+ARRAYS = ['children', 'feature', 'threshold', 'value', 'roots']
+FORMAT_VERSION = 2
+PREDICT_CHUNK_SIZE = 2048
+
+class NumpyForest:
+    def __init__(self, arrays, meta):
+        for name in ARRAYS: setattr(self, name, arrays[name])
+        self.meta = meta
+        self.feature_names_in_ = np.array(meta['features'], dtype=object)
+        self.n_estimators = meta['n_estimators']
+        self.max_depth = meta['max_depth']
+
+    @classmethod
+    def load(cls, path=FAST_MODEL_DIR):
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f: meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+        return cls(arrays, meta)
+
+    # مطابق لـ RandomForestRegressor.predict: المقارنة بعد التحويل إلى float32 والجمع شجرة تلو الأخرى بالترتيب
+    def predict(self, X):
+        if hasattr(X, 'columns'): X = X[self.meta['features']]
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty(len(X))
+        for s in range(0, len(X), PREDICT_CHUNK_SIZE): out[s:s + PREDICT_CHUNK_SIZE] = self._predict_chunk(X[s:s + PREDICT_CHUNK_SIZE])
+        return out
+
+    # العقد بترتيب (شجرة × صف) والخصائص بترتيب (خاصية × صف)، فيكفي في كل مستوى take واحد للابن المختار
+    # (children[2i] يسار و children[2i+1] يمين) بدل قراءة الجهتين ثم np.where
+    def _predict_chunk(self, X):
+        n = len(X)
+        flat = X.T.ravel()
+        feature_base = self.feature * n
+        rows = np.arange(n)
+        nodes = np.repeat(np.asarray(self.roots)[:, None], n, axis=1)
+        for _ in range(self.max_depth):
+            go_right = flat.take(feature_base.take(nodes) + rows) > self.threshold.take(nodes)
+            nodes = self.children.take(nodes * 2 + go_right)
+        leaf_values = self.value.take(nodes)
+        acc = np.zeros(n)
+        for t in range(self.n_estimators): acc += leaf_values[t]
+        return acc / self.n_estimators
+
+# --- التصدير: يحول أشجار RandomForestRegressor إلى مصفوفات مسطحة (الأوراق تشير إلى نفسها) ---
+def export_forest(model, path=FAST_MODEL_DIR, source_sha256=None):
+    children, feature, threshold, value, roots = [], [], [], [], []
+    offset, max_depth = 0, 0
+    for est in model.estimators_:
+        tree = est.tree_
+        ids = np.arange(tree.node_count) + offset
+        is_leaf = tree.children_left == -1
+        children.append(np.column_stack([np.where(is_leaf, ids, tree.children_left + offset), np.where(is_leaf, ids, tree.children_right + offset)]).ravel())
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        value.append(tree.value[:, 0, 0])
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+    # الفهارس بنوع intp حتى لا يحولها take في كل مستوى من مستويات الشجرة
+    arrays = {
+        'children': np.concatenate(children).astype(np.intp), 'feature': np.concatenate(feature).astype(np.intp),
+        'threshold': np.concatenate(threshold).astype(np.float64), 'value': np.concatenate(value).astype(np.float64), 'roots': np.array(roots, dtype=np.intp),
+    }
+    meta = {'format': FORMAT_VERSION, 'features': [str(f) for f in model.feature_names_in_], 'n_estimators': len(model.estimators_), 'max_depth': int(max_depth), 'source_sha256': source_sha256}
+    os.makedirs(path, exist_ok=True)
+    for name, arr in arrays.items(): np.save(os.path.join(path, f'{name}.npy'), arr)
+    with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f: json.dump(meta, f, indent=2)
+    return NumpyForest(arrays, meta)
+
+# --- التحقق: يجب أن تطابق التنبؤات نموذج sklearn تماماً على بيانات تغطي حدود نموذج الإدخال ---
+def verify_forest(model, forest, n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    cols = {
+        'Study_Hours_Per_Week': rng.integers(1, 51, n), 'Attendance_Rate': rng.integers(0, 101, n),
+        'Previous_Average': rng.integers(50, 101, n), 'Failures_History': rng.integers(0, 4, n),
+        'Participation_Score': rng.integers(1, 11, n), 'Marital_Status': rng.integers(0, 2, n),
+        'English_Score': rng.integers(0, 121, n),
+    }
+    X = pd.DataFrame({f: cols[f] for f in forest.meta['features']}).astype(float)
+    X.iloc[::7] += rng.uniform(-0.5, 0.5, X.iloc[::7].shape)
+    expected, got = model.predict(X), forest.predict(X)
+    if not np.array_equal(expected, got):
+        bad = int((expected != got).sum())
+        raise ValueError(f"NumPy predictor does not match sklearn on {bad}/{n} rows (max diff {np.abs(expected - got).max():.3g})")
+    return n
+
+# --- تحميل النموذج: النسخة الخفيفة إذا كانت مطابقة لبصمة ملف pkl، وإلا joblib ---
+def load_model(pkl_path, model_sig=None, fast_dir=FAST_MODEL_DIR):
+    meta_path = os.path.join(fast_dir, META_FILE)
+    if os.path.isfile(meta_path):
+        with open(meta_path, encoding='utf-8') as f: meta = json.load(f)
+        if meta.get('format') == FORMAT_VERSION and (model_sig is None or meta.get('source_sha256') == model_sig): return NumpyForest.load(fast_dir)
+    import joblib
+    return joblib.load(pkl_path)
+
+if __name__ == '__main__':
+    import argparse
+    import joblib
+    from cache import model_checksum
+    parser = argparse.ArgumentParser(description=f"Export {MODEL_FILE} to a memory-mappable NumPy inference artifact")
+    parser.add_argument('--model', default=MODEL_FILE)
+    parser.add_argument('--out', default=FAST_MODEL_DIR)
+    args = parser.parse_args()
+    model = joblib.load(args.model)
+    forest = export_forest(model, args.out, model_checksum(args.model))
+    n = verify_forest(model, NumpyForest.load(args.out))
+    print(f"Exported {forest.n_estimators} trees ({len(forest.value)} nodes) to {args.out}/ - verified on {n} rows")
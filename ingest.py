@@ -0,0 +1,145 @@
+import csv
+import hashlib
+import io
+import time
+import zipfile
+from itertools import accumulate, islice
+from xml.etree.ElementTree import ParseError
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from engine import FEATURES, FEATURE_DEFAULTS, FEATURE_LIMITS
+
+# --- استيراد ملفات الدفعات: قراءة على أجزاء مع التحقق من الأعمدة والقيم قبل المعالجة ---
+ID_COLUMNS = ['Student_Name', 'Student_ID', 'Department']
+REQUIRED_COLUMNS = ID_COLUMNS + [c for c in FEATURES if c not in FEATURE_DEFAULTS]
+INGEST_CHUNK_SIZE = 20000
+ERROR_COLUMNS = ['Row', 'Column', 'Value', 'Reason']
+# ملفات CSV المحفوظة من Excel العربي تكون غالباً بترميز Windows-1256
+CSV_ENCODINGS = ['utf-8-sig', 'cp1256']
+MALFORMED_ROW = '(الصف كاملاً)'
+# أخطاء التحليل التي تعني أن الملف نفسه تالف أو بصيغة غير مدعومة (تلتقط حول القراءة فقط، لا حول التحقق)
+PARSE_ERRORS = (csv.Error, UnicodeDecodeError, zipfile.BadZipFile, InvalidFileException, ParseError)
+# openpyxl يرفع KeyError عندما يكون ملف ZIP سليماً لكن أجزاء المصنف مفقودة منه
+XLSX_ERRORS = PARSE_ERRORS + (KeyError,)
+
+class IngestError(ValueError):
+    pass
+
+def _unreadable(e):
+    return IngestError(f"تعذر قراءة الملف، تأكد من أنه ملف CSV أو Excel سليم ({type(e).__name__}: {e})")
+
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _check_header(columns):
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing: raise IngestError(f"الأعمدة التالية مفقودة من الملف: {', '.join(missing)}")
+
+def _clean_header(header):
+    return [str(h).strip() if h is not None and str(h).strip() else f"Unnamed: {i}" for i, h in enumerate(header)]
+
+def _has_values(r):
+    return any(v is not None and str(v).strip() != '' for v in r)
+
+# صف بعدد حقول مختلف: الحقول الناقصة تعتبر فارغة، والزائدة تقبل فقط إذا كانت فارغة (فواصل زائدة في نهاية السطر)
+# وإلا يسجل الصف كاملاً في تقرير الأخطاء بدل إيقاف قراءة الملف
+def _fit_row(r, width, line_no, errors):
+    if len(r) == width: return r
+    if len(r) > width and any(v is not None and str(v).strip() for v in r[width:]):
+        errors.append((line_no, MALFORMED_ROW, ",".join("" if v is None else str(v) for v in r), f"عدد الحقول ({len(r)}) أكبر من عدد الأعمدة ({width})"))
+        return None
+    return tuple(r[:width]) + (None,) * (width - len(r))
+
+# يحول كل جزء (أرقام الأسطر، الصفوف) إلى DataFrame نصي دون استنتاج الأنواع، وفهرسه = رقم السطر في الملف (السطر 1 هو العناوين)
+# الأجزاء السليمة (كل الصفوف بعدد الأعمدة) لا تمر على الصفوف واحداً واحداً
+def _iter_rows(header, blocks, errors, dtype=object):
+    if header is None: raise IngestError("الملف فارغ")
+    header = _clean_header(header)
+    _check_header(header)
+    width = len(header)
+    for line_nos, rows in blocks:
+        if set(map(len, rows)) != {width}:
+            fitted = [(i, _fit_row(r, width, i, errors)) for i, r in zip(line_nos, rows) if _has_values(r)]
+            line_nos, rows = [i for i, r in fitted if r is not None], [r for _, r in fitted if r is not None]
+        if rows: yield pd.DataFrame(rows, columns=header, index=line_nos, dtype=dtype)
+
+def _decode(data):
+    for encoding in CSV_ENCODINGS:
+        try: return data.decode(encoding)
+        except UnicodeDecodeError: continue
+    raise IngestError(f"تعذر قراءة ترميز الملف (المدعوم: {', '.join(CSV_ENCODINGS)})")
+
+# في الغالب كل سطر سجل واحد (والأسطر الفارغة تعاد كقوائم فارغة)، فتحسب أرقام الأسطر للجزء كاملاً
+# وإذا احتوى الجزء حقولاً متعددة الأسطر (بين علامات اقتباس) يكون رقم كل سجل هو آخر سطر فيه
+def _csv_blocks(reader, chunk_size):
+    start = reader.line_num
+    while rows := list(islice(reader, chunk_size)):
+        end = reader.line_num
+        if end - start == len(rows): line_nos = range(start + 1, end + 1)
+        else: line_nos = list(accumulate((1 + sum(v.count('\n') for v in r) for r in rows), initial=start))[1:]
+        start = end
+        yield line_nos, rows
+
+def _iter_csv(data, chunk_size, errors):
+    text = _decode(data)
+    try:
+        reader = csv.reader(io.StringIO(text, newline=''))
+        header = next(reader, None)
+        yield from _iter_rows(header, _csv_blocks(reader, chunk_size), errors, dtype=str)
+    except PARSE_ERRORS as e: raise _unreadable(e) from e
+
+def _numbered_blocks(numbered_rows, chunk_size):
+    while block := list(islice(numbered_rows, chunk_size)):
+        yield [i for i, _ in block], [r for _, r in block]
+
+def _iter_xlsx(data, chunk_size, errors):
+    try: wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    except XLSX_ERRORS as e: raise _unreadable(e) from e
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        yield from _iter_rows(header, _numbered_blocks(((i, r) for i, r in enumerate(rows, start=2) if any(v is not None for v in r)), chunk_size), errors)
+    except XLSX_ERRORS as e: raise _unreadable(e) from e
+    finally: wb.close()
+
+def _validate_chunk(chunk, errors):
+    bad = np.zeros(len(chunk), dtype=bool)
+    for col in FEATURES:
+        if col not in chunk.columns: chunk[col] = FEATURE_DEFAULTS[col]; continue
+        raw = chunk[col]
+        blank = raw.isna() | (raw.astype(str).str.strip() == '')
+        vals = pd.to_numeric(raw.where(~blank), errors='coerce')
+        if col in FEATURE_DEFAULTS: vals = vals.where(~blank, FEATURE_DEFAULTS[col])
+        lo, hi = FEATURE_LIMITS[col]
+        invalid = (vals.isna() | (vals < lo) | (vals > hi)).to_numpy()
+        for i in np.flatnonzero(invalid):
+            if blank.iat[i]: reason = "قيمة مفقودة"
+            elif pd.isna(vals.iat[i]): reason = "قيمة غير رقمية"
+            else: reason = f"خارج المدى المسموح ({lo} - {hi})"
+            errors.append((chunk.index[i], col, raw.iat[i], reason))
+        bad |= invalid
+        chunk[col] = vals.astype(float)
+    return chunk[~bad]
+
+# --- نقطة الدخول: تعيد الصفوف الصالحة وتقرير الأخطاء وإحصائيات القراءة ---
+def ingest_upload(file_name, data, chunk_size=INGEST_CHUNK_SIZE):
+    start = time.perf_counter()
+    valid, errors, total = [], [], 0
+    chunks = _iter_csv(data, chunk_size, errors) if file_name.lower().endswith('.csv') else _iter_xlsx(data, chunk_size, errors)
+    for chunk in chunks:
+        total += len(chunk)
+        valid.append(_validate_chunk(chunk, errors))
+    total += sum(1 for e in errors if e[1] == MALFORMED_ROW)
+    df = pd.concat(valid) if valid else pd.DataFrame(columns=REQUIRED_COLUMNS + list(FEATURE_DEFAULTS))
+    df = df.reset_index(drop=True)
+    # المسافات الزائدة حول القيم لا تجعل "AI" و "AI " قسمين مختلفين في التحليلات وملفات ZIP
+    for col in ID_COLUMNS: df[col] = df[col].fillna('').astype(str).str.strip()
+    # الخصائص ذات القيم الصحيحة فقط تعاد إلى int حتى تظهر في التقارير كما أدخلت (80 وليس 80.0)
+    for col in FEATURES:
+        if len(df) and (df[col] % 1 == 0).all(): df[col] = df[col].astype('int64')
+        else: df[col] = df[col].astype(float)
+    errors_df = pd.DataFrame(errors, columns=ERROR_COLUMNS).sort_values('Row', kind='stable', ignore_index=True)
+    stats = {'rows_total': total, 'rows_valid': len(df), 'rows_rejected': total - len(df), 'seconds': time.perf_counter() - start}
+    return df, errors_df, stats
@@ -0,0 +1,204 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import pandas as pd
+from cache import model_checksum
+from engine import predict_batch
+from fast_model import MODEL_FILE
+from metrics import get_metrics
+
+# --- طابور معالجة الدفعات في الخلفية (خارج تشغيل سكربت Streamlit) ---
+JOBS_DIR = 'batch_jobs'
+JOBS_DB = 'jobs.db'
+JOB_CHUNK_SIZE = 5000
+JOBS_KEEP = 20  # عدد المهام المنتهية التي تبقى نتائجها على القرص
+STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED = 'queued', 'running', 'done', 'failed'
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total_rows INTEGER,
+    processed_rows INTEGER NOT NULL DEFAULT 0,
+    owner_pid INTEGER,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    seconds REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at);
+"""
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _pid_alive(pid):
+    try: os.kill(pid, 0)
+    except ProcessLookupError: return False
+    except PermissionError: return True
+    return True
+
+# --- عمليات المعالجة: يحمل كل منها النموذج مرة واحدة (النسخة الخفيفة تتشارك صفحات الذاكرة) ---
+_worker_model = None
+
+def _init_worker(model_file):
+    global _worker_model
+    from fast_model import load_model
+    if hasattr(os, 'nice'): os.nice(5)  # أولوية أقل حتى لا تبطئ التحليل الفردي التفاعلي
+    _worker_model = load_model(model_file, model_checksum(model_file))
+
+def _score_chunk(df):
+    return predict_batch(df, _worker_model)[0]
+
+class JobManager:
+    def __init__(self, root=JOBS_DIR, max_workers=None, model_file=MODEL_FILE, keep=JOBS_KEEP):
+        self.root = root
+        self.keep = keep
+        self.db_path = os.path.join(root, JOBS_DB)
+        os.makedirs(root, exist_ok=True)
+        self.model_file = model_file
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self._pool_lock = threading.Lock()
+        self._pool_sig = self._model_sig()
+        self._pool = self._new_pool()
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+            self._fail_orphans(conn)
+            self._prune(conn)
+        finally: conn.close()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker, initargs=(self.model_file,))
+
+    def _model_sig(self):
+        return model_checksum(self.model_file) if os.path.isfile(self.model_file) else None
+
+    # العمليات تحمل النموذج عند إنشائها فقط، فإذا تغير ملف النموذج يستبدل المجمع حتى تستخدم المهام الجديدة النموذج الجديد
+    # (الإرسال داخل القفل حتى لا ترسل مهمة أجزاءها إلى مجمع أغلق، والمهام الجارية تكمل على المجمع القديم)
+    def _submit_chunks(self, df):
+        sig, old = self._model_sig(), None
+        with self._pool_lock:
+            if sig != self._pool_sig: old, self._pool, self._pool_sig = self._pool, self._new_pool(), sig
+            pool = self._pool
+            futures = {pool.submit(_score_chunk, df.iloc[s:s + JOB_CHUNK_SIZE]): s for s in range(0, max(len(df), 1), JOB_CHUNK_SIZE)}
+        if old: old.shutdown(wait=False)
+        return pool, futures
+
+    # إذا توقفت إحدى العمليات بشكل مفاجئ يصبح المجمع غير صالح، فيستبدل بمجمع جديد للمهام اللاحقة
+    def _reset_pool(self, broken):
+        with self._pool_lock:
+            if self._pool is broken: self._pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _update(self, job_id, **fields):
+        conn = self._connect()
+        try:
+            with conn: conn.execute(f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?", (*fields.values(), job_id))
+        finally: conn.close()
+
+    # مهام بقيت معلقة بعد توقف العملية التي كانت تنفذها
+    def _fail_orphans(self, conn):
+        with conn:
+            for row in conn.execute("SELECT id, owner_pid FROM jobs WHERE status IN (?, ?)", (STATUS_QUEUED, STATUS_RUNNING)).fetchall():
+                if row['owner_pid'] != os.getpid() and not _pid_alive(row['owner_pid']):
+                    conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?", (STATUS_FAILED, "توقفت المعالجة بسبب إعادة تشغيل الخادم", _now(), row['id']))
+                    shutil.rmtree(self.job_dir(row['id']), ignore_errors=True)
+
+    # تحذف المهام المنتهية الأقدم (السجل والمجلد) ويبقى آخر self.keep منها فقط
+    def _prune(self, conn):
+        old = [r['id'] for r in conn.execute("SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at DESC LIMIT -1 OFFSET ?", (STATUS_DONE, STATUS_FAILED, self.keep))]
+        if not old: return
+        with conn: conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in old])
+        for job_id in old: shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def result_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), 'result.pkl')
+
+    # تستقبل الصفوف الصالحة بعد التحقق (ingest_upload) وتحفظها في مجلد المهمة
+    def submit(self, file_name, df):
+        job_id = uuid.uuid4().hex[:12]
+        os.makedirs(self.job_dir(job_id))
+        input_path = os.path.join(self.job_dir(job_id), 'input.pkl')
+        df.to_pickle(input_path)
+        conn = self._connect()
+        try:
+            with conn: conn.execute("INSERT INTO jobs (id, file_name, status, total_rows, owner_pid, created_at) VALUES (?, ?, ?, ?, ?, ?)", (job_id, file_name, STATUS_QUEUED, len(df), os.getpid(), _now()))
+        finally: conn.close()
+        threading.Thread(target=self._run, args=(job_id, input_path), name=f'batch-job-{job_id}', daemon=True).start()
+        return job_id
+
+    # يقسم الصفوف إلى أجزاء توزع على العمليات، ويسجل التقدم في جدول المهام بعد كل جزء
+    def _run(self, job_id, input_path):
+        start = time.perf_counter()
+        self._update(job_id, status=STATUS_RUNNING, started_at=_now())
+        pool = None
+        try:
+            df = pd.read_pickle(input_path)
+            pool, futures = self._submit_chunks(df)
+            parts, done = {}, 0
+            for fut in as_completed(futures):
+                parts[futures[fut]] = fut.result()
+                done += len(parts[futures[fut]])
+                self._update(job_id, processed_rows=done)
+            result = pd.concat([parts[s] for s in sorted(parts)])
+            result.to_pickle(self.result_path(job_id))
+            elapsed = time.perf_counter() - start
+            self._update(job_id, status=STATUS_DONE, finished_at=_now(), seconds=elapsed)
+            get_metrics().record('batch_job', elapsed); get_metrics().incr('rows_processed', len(result))
+        except Exception as e:
+            logger.exception("Batch job %s failed", job_id)
+            if isinstance(e, BrokenProcessPool) and pool: self._reset_pool(pool)
+            self._update(job_id, status=STATUS_FAILED, finished_at=_now(), seconds=time.perf_counter() - start, error=str(e))
+            get_metrics().incr('jobs_failed')
+        # ملف الإدخال لم يعد لازماً بعد انتهاء المهمة (بنجاح أو فشل)
+        try: os.remove(input_path)
+        except OSError: pass
+        conn = self._connect()
+        try: self._prune(conn)
+        finally: conn.close()
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return dict(row) if row else None
+        finally: conn.close()
+
+    def list_jobs(self, limit=20):
+        conn = self._connect()
+        try: return [dict(r) for r in conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))]
+        finally: conn.close()
+
+    def load_result(self, job_id):
+        return pd.read_pickle(self.result_path(job_id))
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_job_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None: _manager = JobManager()
+    return _manager
@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+
+# --- قياسات التشغيل: مؤقتات لكل مرحلة وعدادات وسجل دائري لآخر التوقيتات (في الذاكرة فقط) ---
+# كل تسجيل = perf_counter مرتين + قفل + إضافة إلى deque محدود، لذلك يمكن تركها مفعلة دائماً
+METRICS_FILE = 'app_metrics.json'
+RECENT_SIZE = 2000
+
+class Metrics:
+    def __init__(self, recent_size=RECENT_SIZE):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stages = {}    # stage -> [calls, total_seconds, max_seconds]
+        self._counters = {}
+        self._recent = deque(maxlen=recent_size)  # (time, stage, seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try: yield
+        finally: self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            s = self._stages.get(stage)
+            if s is None: s = self._stages[stage] = [0, 0.0, 0.0]
+            s[0] += 1; s[1] += seconds
+            if seconds > s[2]: s[2] = seconds
+            self._recent.append((time.time(), stage, seconds))
+
+    def incr(self, name, n=1):
+        with self._lock: self._counters[name] = self._counters.get(name, 0) + n
+
+    def counters(self):
+        with self._lock: return dict(self._counters)
+
+    def recent(self, limit=None):
+        with self._lock: items = list(self._recent)
+        items = items[-limit:] if limit else items
+        return [{'time': datetime.fromtimestamp(t).strftime("%H:%M:%S"), 'stage': stage, 'ms': seconds * 1000} for t, stage, seconds in reversed(items)]
+
+    # المتوسط والأقصى منذ بدء التشغيل، والمئينات من السجل الدائري (آخر RECENT_SIZE قياس)
+    def stage_summary(self):
+        with self._lock:
+            stages = {k: list(v) for k, v in self._stages.items()}
+            recent = list(self._recent)
+        out = []
+        for stage, (calls, total, worst) in sorted(stages.items(), key=lambda kv: -kv[1][1]):
+            ms = np.array([s for _, name, s in recent if name == stage]) * 1000
+            out.append({'stage': stage, 'calls': calls, 'total_s': total, 'avg_ms': total / calls * 1000, 'p50_ms': float(np.percentile(ms, 50)) if len(ms) else None,
+                        'p95_ms': float(np.percentile(ms, 95)) if len(ms) else None, 'max_ms': worst * 1000})
+        return out
+
+    def snapshot(self, **extra):
+        return {'exported_at': datetime.now().isoformat(timespec='seconds'), 'uptime_seconds': time.time() - self.started, 'pid': os.getpid(),
+                'counters': self.counters(), 'stages': self.stage_summary(), 'recent': self.recent(), **extra}
+
+    # الكتابة إلى ملف مؤقت ثم استبداله حتى لا يقرأ ملف نصف مكتوب
+    def export(self, path=METRICS_FILE, **extra):
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(self.snapshot(**extra), f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear(); self._counters.clear(); self._recent.clear()
+            self.started = time.time()
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None: _metrics = Metrics()
+    return _metrics
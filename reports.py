@@ -0,0 +1,217 @@
+import base64
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import urllib.request
+import zipfile
+from engine import RISK_THRESHOLD, simulate_cohort
+
+# --- رابط الشعار المباشر (من موقع الكلية) ---
+LOGO_URL = "https://teeng.alayen.edu.iq/public/ar/image/site/new_logo.png"
+FONTS_URL = "https://fonts.googleapis.com/css2?family=Cairo:wght@400;700&display=swap"
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+LOGO_FILE = os.path.join(ASSETS_DIR, 'logo.png')
+FONT_CSS_FILE = os.path.join(ASSETS_DIR, 'fonts.css')
+REPORT_CHUNK_SIZE = 500
+
+# --- الأصول المشتركة: الشعار والخطوط تضمن مرة واحدة لكل وثيقة (data URI) لتعمل الطباعة دون اتصال ---
+# تجهز مرة واحدة قبل التشغيل: python reports.py --fetch-assets (لا يوجد أي اتصال بالشبكة أثناء توليد التقارير)
+# إن لم تكن موجودة تستخدم الروابط المباشرة، ويعاد فحص المجلد كل دقيقة حتى لا تبقى حالة النقص حتى إعادة التشغيل
+ASSET_RECHECK_SECONDS = 60
+FETCH_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+_assets = None  # (expires_at, assets)
+
+def _data_uri(data, mime):
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+def _read_asset(path):
+    try:
+        with open(path, 'rb') as f: return f.read()
+    except OSError: return None
+
+def _build_assets(logo, font_css):
+    w, h = 100, 100
+    if logo and logo[:8] == b'\x89PNG\r\n\x1a\n': w, h = struct.unpack('>II', logo[16:24])
+    href = _data_uri(logo, 'image/png') if logo else LOGO_URL
+    symbol = f'<svg style="display:none"><symbol id="auiq-logo" viewBox="0 0 {w} {h}"><image href="{href}" width="{w}" height="{h}"/></symbol></svg>'
+    font_css = font_css.decode('utf-8') if font_css else f"@import url('{FONTS_URL}');"
+    heads = {auto_print: _HTML_HEAD_TEMPLATE.format(font_css=font_css, print_script=PRINT_SCRIPT if auto_print else "", logo_symbol=symbol) for auto_print in (False, True)}
+    return {'logo': f'<svg class="logo" viewBox="0 0 {w} {h}"><use href="#auiq-logo"/></svg>', 'heads': heads}
+
+def _load_assets():
+    global _assets
+    if _assets is not None and time.monotonic() < _assets[0]: return _assets[1]
+    logo, font_css = _read_asset(LOGO_FILE), _read_asset(FONT_CSS_FILE)
+    assets = _build_assets(logo, font_css)
+    _assets = (float('inf') if logo and font_css else time.monotonic() + ASSET_RECHECK_SECONDS, assets)
+    return assets
+
+# ملفات assets غير الموجودة: التقارير عندها تعتمد على روابط خارجية للشعار والخطوط ولا تطبع كاملة دون إنترنت
+def missing_assets():
+    return [os.path.relpath(p, os.path.dirname(ASSETS_DIR)) for p in (LOGO_FILE, FONT_CSS_FILE) if not os.path.isfile(p)]
+
+def _download(url):
+    with urllib.request.urlopen(urllib.request.Request(url, headers={'User-Agent': FETCH_USER_AGENT}), timeout=30) as resp: return resp.read()
+
+# ينزل الشعار وملف خطوط Cairo (مع تضمين ملفات woff2 داخله) إلى مجلد assets
+def fetch_assets():
+    global _assets
+    logo = _download(LOGO_URL)
+    css = re.sub(r"url\((https://[^)]+)\)", lambda m: f"url({_data_uri(_download(m.group(1)), 'font/woff2')})", _download(FONTS_URL).decode('utf-8'))
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    for path, data in ((LOGO_FILE, logo), (FONT_CSS_FILE, css.encode('utf-8'))):
+        with open(f"{path}.tmp", 'wb') as f: f.write(data)
+        os.replace(f"{path}.tmp", path)
+    _assets = None
+    return [LOGO_FILE, FONT_CSS_FILE]
+
+# --- قالب رأس الوثيقة (يبنى مرة واحدة مع الأصول) ---
+_HTML_HEAD_TEMPLATE = """<!DOCTYPE html><html lang="ar" dir="rtl"><head><meta charset="UTF-8">
+    <style>{font_css}
+    body {{ font-family: 'Cairo', 'Times New Roman'; padding: 40px; background-color: #f4f4f4; }}
+    .box {{ border: 1px solid #ddd; padding: 40px; max-width: 210mm; margin: auto; background-color: white; margin-bottom: 20px; box-shadow: 0 2px 5px rgba(0,0,0,0.05); }}
+    .header {{ text-align: center; }} table {{ width: 100%; border-collapse: collapse; }} td {{ padding: 10px; border-bottom: 1px solid #eee; }} .num {{ direction: ltr; display: inline-block; font-weight: bold; }}
+    .logo {{ width: 110px; margin-bottom: 5px; }} .header h2 {{ margin: 5px 0; }} .header h3 {{ margin: 0; font-weight: normal; }} .header hr {{ border-top: 2px solid #000; margin-top: 15px; }}
+    .info {{ background-color: #f9f9f9; padding: 15px; border-radius: 5px; margin-top: 20px; }} td.r {{ text-align: right; }} td.l {{ text-align: left; }} .big {{ font-size: 1.2em; }}
+    .diagnosis {{ margin-top: 25px; }} .roadmap {{ margin-top: 20px; }} .diagnosis h4, .roadmap h4 {{ border-bottom: 1px solid #ccc; padding-bottom: 5px; }} .diagnosis p, .roadmap ul {{ line-height: 1.6; }} .roadmap li {{ margin-bottom: 5px; }}
+    .signatures {{ margin-top: 50px; display: flex; justify-content: space-between; }} .signatures div {{ text-align: center; }}
+    @media print {{ .no-print {{ display: none; }} body {{ background-color: white; padding: 0; }} .box {{ border: none; margin: 0; width: 100%; max-width: 100%; box-shadow: none; }} .page-break {{ page-break-after: always; }} }}
+    </style>{print_script}</head><body>{logo_symbol}<div class="report-container-wrapper">"""
+
+# --- مقياس زمن توليد تقارير الدفعات (يسجل مرة لكل جزء وليس لكل تقرير) ---
+_render_lock = threading.Lock()
+_render_totals = {'reports': 0, 'seconds': 0.0}
+
+def _record_render(count, seconds):
+    with _render_lock:
+        _render_totals['reports'] += count; _render_totals['seconds'] += seconds
+
+def render_stats():
+    with _render_lock: n, secs = _render_totals['reports'], _render_totals['seconds']
+    return {'reports': n, 'total_seconds': secs, 'avg_ms': secs / n * 1000 if n else 0.0}
+
+# --- تاريخ التقرير: يحسب مرة واحدة في اليوم بدل كل تقرير (datetime.now().strftime كانت نصف زمن التقرير) ---
+_report_day = (0.0, '')  # (next_midnight, 'YYYY-MM-DD')
+
+def _today():
+    global _report_day
+    now = time.time()
+    if now >= _report_day[0]:
+        lt = time.localtime(now)
+        _report_day = (time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday + 1, 0, 0, 0, 0, 0, -1)), time.strftime('%Y-%m-%d', lt))
+    return _report_day[1]
+
+# --- توليد التقرير الرسمي: f-string واحدة والشعار مرجع قصير للرمز المضمن في رأس الوثيقة ---
+def _render_report_body(name, sid, dept, pred, steps, attend, study, eng, married, report_date, logo):
+    status = "مستوى حرج 🔴" if pred < RISK_THRESHOLD else "مستوى مطمئن 🟢"
+    m_status = "متزوج" if married == 1 else "أعزب"
+    rec_html = "".join([f"<li>{s}</li>" for s in steps])
+    return f"""
+    <div class="box page-break">
+        <div class="header">
+            {logo}
+            <h2>جامعة العين العراقية</h2>
+            <h3>الكلية التقنية الهندسية - قسم {dept}</h3>
+            <hr>
+        </div>
+        <div class="info">
+            <table>
+                <tr><td class="r"><strong>الطالب:</strong> {name}</td><td class="l"><strong>الرقم الجامعي:</strong> <span class="num">{sid}</span></td></tr>
+                <tr><td class="r"><strong>الحالة الاجتماعية:</strong> {m_status}</td><td class="l"><strong>كفاءة الإنجليزية:</strong> <span class="num">{eng}%</span></td></tr>
+                <tr><td class="r"><strong>تاريخ التقرير:</strong> <span class="num">{report_date}</span></td><td class="l"><strong>مؤشر الأداء المتوقع:</strong> <span class="num big">{pred:.1f}%</span></td></tr>
+            </table>
+        </div>
+        <div class="diagnosis">
+            <h4>أولاً: التشخيص الأكاديمي (Academic Diagnosis)</h4>
+            <p>بناءً على خوارزميات الذكاء الاصطناعي، تم تصنيف وضع الطالب ضمن: <strong>{status}</strong>. تشير البيانات إلى أن الالتزام بالحضور بنسبة (<span class="num">{attend}%</span>) والمجهود الدراسي الأسبوعي (<span class="num">{study}</span> ساعة) هما العاملان الأكثر تأثيراً.</p>
+        </div>
+        <div class="roadmap">
+            <h4>ثانياً: خارطة الطريق المقترحة (Recommended Roadmap)</h4>
+            <ul>{rec_html}</ul>
+        </div>
+        <div class="signatures">
+            <div>____________________<br>توقيع المرشد الأكاديمي</div>
+            <div>____________________<br>ختم القسم العلمي</div>
+        </div>
+    </div><br class="no-print">"""
+
+def generate_single_report_body(name, sid, dept, pred, steps, attend, study, eng, married, report_date=None):
+    return _render_report_body(name, sid, dept, pred, steps, attend, study, eng, married, report_date or _today(), _load_assets()['logo'])
+
+PRINT_SCRIPT = "<script>window.onload = function() { window.print(); }</script>"
+
+def generate_html_head(auto_print=False):
+    return _load_assets()['heads'][bool(auto_print)]
+
+HTML_FOOT = "</div></body></html>"
+
+def generate_full_html_document(report_bodies, auto_print=False):
+    return generate_html_head(auto_print) + report_bodies + HTML_FOOT
+
+# --- توليد تقارير الدفعة كتيار (طالب تلو الآخر) بدل تجميعها في نص واحد ---
+def iter_report_bodies(batch_df, model, chunk_size=REPORT_CHUNK_SIZE):
+    report_date, logo = _today(), _load_assets()['logo']
+    for s in range(0, len(batch_df), chunk_size):
+        chunk = batch_df.iloc[s:s + chunk_size]
+        all_steps = simulate_cohort(chunk, model, chunk['Prediction'])
+        cols = [chunk[c].tolist() for c in ['Student_Name', 'Student_ID', 'Department', 'Prediction', 'Attendance_Rate', 'Study_Hours_Per_Week', 'English_Score', 'Marital_Status']]
+        spent = 0.0
+        for name, sid, dept, pred, attend, study, eng, married, steps in zip(*cols, all_steps):
+            start = time.perf_counter()
+            body = _render_report_body(name, str(sid), dept, pred, steps, attend, study, eng, married, report_date, logo)
+            spent += time.perf_counter() - start
+            yield body
+        _record_render(len(chunk), spent)
+
+def iter_html_document(bodies, auto_print=False):
+    yield generate_html_head(auto_print)
+    yield from bodies
+    yield HTML_FOOT
+
+def write_html_stream(parts, fp):
+    for part in parts: fp.write(part.encode('utf-8'))
+
+def _safe_name(text):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', str(text)).strip('_') or 'part'
+
+# أقسام مختلفة قد تعطي الاسم نفسه بعد التنظيف (CS/A و CS A) فيضاف _2، _3... حتى لا تستبدل ملفات داخل ZIP
+# (المقارنة دون حالة الأحرف لأن بعض أنظمة الملفات لا تفرق بينها)
+def _unique_names(names):
+    seen = set()
+    for name in names:
+        unique, n = name, 1
+        while unique.lower() in seen:
+            n += 1; unique = f"{name}_{n}"
+        seen.add(unique.lower())
+        yield unique
+
+def _split_batch(batch_df, group_by=None, per_file=None):
+    if group_by:
+        groups = list(batch_df.groupby(group_by, sort=False))
+        return list(zip(_unique_names(_safe_name(k) for k, _ in groups), (g for _, g in groups)))
+    return [(f"part_{i // per_file + 1:03d}", batch_df.iloc[i:i + per_file]) for i in range(0, len(batch_df), per_file)]
+
+# --- تصدير تقارير الدفعة إلى ملف مؤقت (HTML واحد أو ZIP مقسم حسب القسم / عدد الطلاب) ---
+# يعيد مسار الملف ونوعه، والمستدعي مسؤول عن حذفه بعد الاستخدام
+def export_batch_reports(batch_df, model, auto_print=True, group_by=None, per_file=None):
+    if not group_by and not per_file:
+        fd, path = tempfile.mkstemp(suffix='.html')
+        with os.fdopen(fd, 'wb') as fp:
+            write_html_stream(iter_html_document(iter_report_bodies(batch_df, model), auto_print), fp)
+        return path, 'text/html'
+    fd, path = tempfile.mkstemp(suffix='.zip')
+    with os.fdopen(fd, 'wb') as raw, zipfile.ZipFile(raw, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, part_df in _split_batch(batch_df, group_by, per_file):
+            with zf.open(f"Reports_{name}.html", 'w') as fp:
+                write_html_stream(iter_html_document(iter_report_bodies(part_df, model), auto_print), fp)
+    return path, 'application/zip'
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Download the logo and Cairo fonts into assets/ so printed reports need no network")
+    parser.add_argument('--fetch-assets', action='store_true', required=True)
+    parser.parse_args()
+    for path in fetch_assets(): print(f"Saved {path} ({os.path.getsize(path) // 1024} KB)")
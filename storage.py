@@ -0,0 +1,265 @@
+import atexit
+import csv
+import json
+import logging
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from engine import FEATURES, RISK_THRESHOLD
+
+# --- قاعدة بيانات الاستبيان (SQLite بنمط WAL) ---
+DB_FILE = 'collected_dataset.db'
+LEGACY_CSV_FILE = 'collected_dataset.csv'
+COLUMNS = ['Student_Name', 'Student_ID', 'Department', 'Prediction'] + FEATURES + ['Timestamp']
+WRITE_BATCH_SIZE = 500
+EXPORT_FETCH_SIZE = 5000
+WRITE_RETRIES = 5
+PENDING_RETRY_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS survey (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Student_Name TEXT, Student_ID TEXT, Department TEXT, Prediction REAL,
+    {', '.join(f'{c} NUMERIC' for c in FEATURES)},
+    Timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_survey_student_id ON survey(Student_ID);
+CREATE INDEX IF NOT EXISTS idx_survey_department ON survey(Department);
+CREATE INDEX IF NOT EXISTS idx_survey_timestamp ON survey(Timestamp);
+"""
+# --- ملخصات تراكمية (يوم × قسم) تحدث مع كل دفعة كتابة، وتبنى منها لوحة التحليلات دون مسح السجلات ---
+HIST_BINS = 10
+STATS_COUNT_COLUMNS = ['n', 'at_risk'] + [f'bin_{i}' for i in range(HIST_BINS)]
+STATS_SUM_COLUMNS = ['sum_prediction'] + [f'sum_{c}' for c in FEATURES]
+STATS_COLUMNS = STATS_COUNT_COLUMNS + STATS_SUM_COLUMNS
+_STATS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS survey_stats (
+    day TEXT NOT NULL, Department TEXT NOT NULL,
+    {', '.join(f'{c} INTEGER NOT NULL DEFAULT 0' for c in STATS_COUNT_COLUMNS)},
+    {', '.join(f'{c} REAL NOT NULL DEFAULT 0' for c in STATS_SUM_COLUMNS)},
+    PRIMARY KEY (day, Department)
+);
+"""
+_UPSERT_STATS = (f"INSERT INTO survey_stats (day, Department, {', '.join(STATS_COLUMNS)}) VALUES ({', '.join('?' * (len(STATS_COLUMNS) + 2))}) "
+                 f"ON CONFLICT(day, Department) DO UPDATE SET {', '.join(f'{c} = {c} + excluded.{c}' for c in STATS_COLUMNS)}")
+_BIN_SQL = f"MIN(MAX(CAST(Prediction / {100 // HIST_BINS} AS INTEGER), 0), {HIST_BINS - 1})"
+_BACKFILL_STATS = (f"INSERT INTO survey_stats (day, Department, {', '.join(STATS_COLUMNS)}) "
+                   f"SELECT substr(Timestamp, 1, 10), COALESCE(Department, ''), COUNT(*), SUM(Prediction < {RISK_THRESHOLD}), "
+                   f"{', '.join(f'SUM({_BIN_SQL} = {i})' for i in range(HIST_BINS))}, SUM(Prediction), "
+                   f"{', '.join(f'TOTAL({c})' for c in FEATURES)} FROM survey WHERE Prediction IS NOT NULL GROUP BY 1, 2")
+
+def _aggregate(rows):
+    i_dept, i_pred, i_ts = COLUMNS.index('Department'), COLUMNS.index('Prediction'), COLUMNS.index('Timestamp')
+    i_feats = [COLUMNS.index(c) for c in FEATURES]
+    acc = {}
+    for r in rows:
+        if r[i_pred] is None: continue
+        p = float(r[i_pred])
+        a = acc.setdefault((str(r[i_ts])[:10], r[i_dept] or ''), [0] * len(STATS_COLUMNS))
+        a[0] += 1; a[1] += p < RISK_THRESHOLD
+        a[2 + min(max(int(p // (100 // HIST_BINS)), 0), HIST_BINS - 1)] += 1
+        a[len(STATS_COUNT_COLUMNS)] += p
+        for j, i in enumerate(i_feats, start=len(STATS_COUNT_COLUMNS) + 1): a[j] += float(r[i] or 0)
+    return [key + tuple(vals) for key, vals in acc.items()]
+
+_INSERT = f"INSERT INTO survey ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+_STOP = object()
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+# --- مخزن الاستبيان: كل الكتابات تمر عبر طابور واحد وخيط كاتب واحد يدمجها في معاملات ---
+class SurveyStore:
+    def __init__(self, path=DB_FILE, legacy_csv=LEGACY_CSV_FILE):
+        self.path = path
+        self.pending_path = f"{path}.pending.jsonl"
+        self._queue = queue.Queue()
+        conn = _connect(path)
+        try:
+            conn.executescript(_SCHEMA + _STATS_SCHEMA)
+            if legacy_csv and os.path.isfile(legacy_csv): self._import_legacy_csv(conn, legacy_csv)
+            self._backfill_stats(conn)
+        finally: conn.close()
+        self._writer = threading.Thread(target=self._write_loop, name='survey-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # نقل بيانات ملف CSV القديم مرة واحدة (فقط إذا كانت القاعدة فارغة)
+    def _import_legacy_csv(self, conn, legacy_csv):
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('SELECT 1 FROM survey LIMIT 1').fetchone(): return
+            with open(legacy_csv, newline='', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                batch = []
+                for rec in reader:
+                    batch.append(tuple(rec.get(c) for c in COLUMNS))
+                    if len(batch) >= EXPORT_FETCH_SIZE: conn.executemany(_INSERT, batch); batch = []
+                if batch: conn.executemany(_INSERT, batch)
+
+    # بناء الملخصات من السجلات الموجودة مرة واحدة (قواعد بيانات أنشئت قبل إضافة جدول الملخصات)
+    def _backfill_stats(self, conn):
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('SELECT 1 FROM survey_stats LIMIT 1').fetchone(): return
+            conn.execute(_BACKFILL_STATS)
+
+    def add(self, row):
+        self._queue.put(tuple(row))
+
+    # أي خطأ غير متوقع يسجل ولا يوقف الخيط، وإلا بقيت السجلات في الطابور دون كتابة
+    def _write_loop(self):
+        conn = _connect(self.path)
+        next_replay = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_replay:
+                    next_replay = time.monotonic() + PENDING_RETRY_SECONDS
+                    self._replay_pending(conn)
+                if self._write_next(conn, timeout=max(next_replay - time.monotonic(), 0.1)): break
+            except Exception:
+                logger.exception("Unexpected error in the survey writer; continuing")
+        conn.close()
+
+    # يكتب الدفعة التالية من الطابور، ويعيد True عند طلب الإيقاف
+    def _write_next(self, conn, timeout):
+        try: batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty: return False
+        while len(batch) < WRITE_BATCH_SIZE:
+            try: batch.append(self._queue.get_nowait())
+            except queue.Empty: break
+        rows = [b for b in batch if b is not _STOP]
+        try:
+            if rows: self._write_rows(conn, rows)
+        except Exception:
+            logger.exception("Survey write failed; keeping %d rows in %s for a later retry", len(rows), self.pending_path)
+            self._spill(rows)
+        finally:
+            for _ in batch: self._queue.task_done()
+        return len(rows) < len(batch)
+
+    # السجلات التي فشلت كتابتها تحفظ في ملف جانبي وتعاد محاولة إدخالها عند بدء التشغيل وكل دقيقة
+    def _spill(self, rows):
+        data = ''.join(json.dumps(row, ensure_ascii=False, default=str) + '\n' for row in rows).encode('utf-8')
+        try:
+            with open(self.pending_path, 'ab+') as f:
+                # سطر أخير مقطوع (توقف مفاجئ أو امتلاء القرص) لا يلتصق بالسجلات الجديدة
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n': data = b'\n' + data
+                f.write(data)
+        except OSError:
+            logger.critical("Could not save %d unwritten survey rows to %s: %r", len(rows), self.pending_path, rows, exc_info=True)
+
+    # الأسطر التي لا يمكن قراءتها تنقل إلى ملف .bad بدلاً من إيقاف الاستعادة
+    def _replay_pending(self, conn):
+        if not os.path.isfile(self.pending_path): return
+        rows, bad = [], []
+        with open(self.pending_path, encoding='utf-8', errors='surrogateescape') as f:
+            for line in f:
+                if not line.strip(): continue
+                try:
+                    row = json.loads(line)
+                    if not isinstance(row, list) or len(row) != len(COLUMNS): raise ValueError(f"expected {len(COLUMNS)} columns")
+                    rows.append(tuple(row))
+                except ValueError:
+                    bad.append(line if line.endswith('\n') else line + '\n')
+        if bad:
+            bad_path = f"{self.pending_path}.bad"
+            with open(bad_path, 'a', encoding='utf-8', errors='surrogateescape') as f: f.writelines(bad)
+            tmp = f"{self.pending_path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f: f.writelines(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+            os.replace(tmp, self.pending_path)
+            logger.error("Moved %d unreadable pending survey rows to %s", len(bad), bad_path)
+        try:
+            if rows: self._write_rows(conn, rows)
+        except Exception:
+            logger.exception("Replaying %d pending survey rows failed; will retry", len(rows))
+            return
+        os.remove(self.pending_path)
+        if rows: logger.info("Recovered %d pending survey rows from %s", len(rows), self.pending_path)
+
+    def _write_rows(self, conn, rows):
+        for attempt in range(WRITE_RETRIES):
+            try:
+                with conn:
+                    conn.executemany(_INSERT, rows)
+                    conn.executemany(_UPSERT_STATS, _aggregate(rows))
+                return
+            except sqlite3.OperationalError:
+                if attempt == WRITE_RETRIES - 1: raise
+                time.sleep(0.2 * (attempt + 1))
+
+    # ينتظر حتى تكتب كل السجلات المعلقة في الطابور
+    def flush(self):
+        if self._writer.is_alive(): self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(_STOP); self._writer.join(timeout=10)
+
+    def count(self):
+        conn = _connect(self.path)
+        try: return conn.execute('SELECT COUNT(*) FROM survey').fetchone()[0]
+        finally: conn.close()
+
+    def stats_rows(self):
+        conn = _connect(self.path)
+        try:
+            cur = conn.execute(f"SELECT day, Department, {', '.join(STATS_COLUMNS)} FROM survey_stats ORDER BY day")
+            return [d[0] for d in cur.description], cur.fetchall()
+        finally: conn.close()
+
+    def iter_rows(self, fetch_size=EXPORT_FETCH_SIZE):
+        self.flush()
+        conn = _connect(self.path)
+        try:
+            cur = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM survey ORDER BY id")
+            while True:
+                rows = cur.fetchmany(fetch_size)
+                if not rows: break
+                yield from rows
+        finally: conn.close()
+
+    # --- التصدير: يقرأ من القاعدة على دفعات ويكتب مباشرة إلى ملف مؤقت (المستدعي يحذفه) ---
+    def export_csv(self):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(self.iter_rows())
+        return path
+
+    def export_excel(self):
+        from openpyxl import Workbook
+        fd, path = tempfile.mkstemp(suffix='.xlsx'); os.close(fd)
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Students_Dataset')
+        ws.append(COLUMNS)
+        for row in self.iter_rows(): ws.append(row)
+        wb.save(path)
+        return path
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None: _store = SurveyStore()
+    return _store
+
+# --- دالة الحفظ التلقائي (الاستبيان) ---
+def save_data_collection(student_name, student_id, dept, inputs_df, prediction, store=None):
+    features = inputs_df[FEATURES].iloc[0].tolist()
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    (store or get_store()).add([student_name, student_id, dept, float(prediction)] + features + [timestamp])